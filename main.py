@@ -2,30 +2,1237 @@ import sys
 import os
 import sqlite3
 import re
+import html
+import hashlib
+import base64
+import binascii
+import bisect
+import functools
+import itertools
+import json
+import secrets
+import socket
+import mmap
+import array
+import pickle
+import queue
+import random
+import threading
+import multiprocessing
 import webbrowser
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from pathlib import Path
+from collections import Counter, OrderedDict, namedtuple
+from html.parser import HTMLParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout,
-    QLineEdit, QTableWidget, QTableWidgetItem, QTextEdit, QSizePolicy, QSplitter, QHeaderView, QAction, QMenu, QMessageBox
+    QLineEdit, QTableWidget, QTableWidgetItem, QTextEdit, QSizePolicy, QSplitter, QHeaderView, QAction, QMenu, QMessageBox,
+    QFileDialog, QPlainTextEdit, QStackedWidget, QInputDialog
+)
+from PyQt5.QtCore import (
+    Qt, QSize, QDateTime, QSettings, QTimer, QObject, QFileSystemWatcher, QPoint, QRegularExpression, pyqtSignal,
+    QBuffer, QVariant, QMimeData
+)
+from PyQt5.QtGui import (
+    QIcon, QBrush, QColor, QTextCharFormat, QTextCursor, QKeySequence, QFont, QPainter, QTextDocument, QTextBlockUserData,
+    QTextListFormat, QTextImageFormat, QImage
 )
-from PyQt5.QtCore import Qt, QSize, QDateTime, QSettings
-from PyQt5.QtGui import QIcon, QBrush, QColor, QTextCharFormat, QTextCursor, QKeySequence, QFont, QPainter
 from datetime import datetime, timedelta
 from tld import get_tld
 
+# [[Title]] references as typed, and the note: anchors render_links turns them into
+WIKI_LINK_PATTERN = re.compile(r'\[\[([^\]]+)\]\]')
+NOTE_ANCHOR_PATTERN = re.compile(r'(<a\s+href=")note:([^"]*)("[^>]*>)(.*?)(</a>)', re.DOTALL)
+
+def extract_note_links(content):
+    """Return the set of note titles a note body links to."""
+    links = {html.unescape(title) for title in WIKI_LINK_PATTERN.findall(content)}
+    links.update(html.unescape(match.group(2)) for match in NOTE_ANCHOR_PATTERN.finditer(content))
+    return links
+
+# Image names of pictures kept in the blob store (see BlobStore)
+BLOB_NAME_PATTERN = re.compile(r'blob:([0-9a-f]{64})')
+
+def update_note_blobs(conn, note_id, content):
+    """Bring the note_blobs rows of a note in line with the images its body shows."""
+    hashes = set(BLOB_NAME_PATTERN.findall(content))
+    if hashes != {row[0] for row in conn.execute("SELECT hash FROM note_blobs WHERE note_id=?", (note_id,))}:
+        conn.execute("DELETE FROM note_blobs WHERE note_id=?", (note_id,))
+        conn.executemany("INSERT INTO note_blobs (note_id, hash) VALUES (?, ?)", [(note_id, key) for key in hashes])
+
+class _PlainTextExtractor(HTMLParser):
+    # Collects the visible text of a Qt rich text body, one line per block
+    SKIP_TAGS = {"head", "style", "script", "title"}
+    BLOCK_TAGS = {"p", "div", "li", "h1", "h2", "h3", "h4", "h5", "h6", "pre", "tr", "blockquote"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skip_depth = 0
+        self.block_depth = 0
+        self.empty_block = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag in self.BLOCK_TAGS:
+            self.block_depth += 1
+            # Qt writes empty lines as <p style="-qt-paragraph-type:empty"><br /></p>
+            self.empty_block = "-qt-paragraph-type:empty" in (dict(attrs).get("style") or "")
+        elif tag == "br" and not self.empty_block:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self.skip_depth = max(self.skip_depth - 1, 0)
+        elif tag in self.BLOCK_TAGS:
+            self.block_depth = max(self.block_depth - 1, 0)
+            self.empty_block = False
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        # Whitespace between blocks is markup formatting, not text
+        if self.skip_depth or (not self.block_depth and not data.strip()):
+            return
+        self.parts.append(data)
+
+def plain_text_to_html(text):
+    """Return plain text as a note body in the compact storage format."""
+    doc = QTextDocument()
+    doc.setPlainText(text)
+    return document_to_html(doc)
+
+def html_to_text(content):
+    """Return the plain text of a stored note body."""
+    if "<" not in content:
+        return html.unescape(content)
+    extractor = _PlainTextExtractor()
+    extractor.feed(content)
+    extractor.close()
+    text = "".join(extractor.parts)
+    if text.endswith("\n"):
+        text = text[:-1]
+    return text.replace("\xa0", " ").replace("\u2029", "\n").replace("\u2028", "\n")
+
+# Compact storage format: the formatting the editor supports as a minimal tag subset. Paragraph margins are
+# zeroed up front so plain lines need no attributes; class "e" marks empty paragraphs, which Qt would drop.
+COMPACT_HTML_HEADER = (
+    '<head><style>p,li,h1,h2,h3,h4,h5,h6,ul,ol{margin:0}.e{-qt-paragraph-type:empty}</style></head>'
+    '<body style="white-space:pre-wrap">'
+)
+# Anything in a compact body other than plain paragraphs and line breaks
+RICH_TAG_PATTERN = re.compile(r'<(?!(?:/?p|p class="e"|br|/body)>)')
+
+def has_rich_content(content, format):
+    """Return whether a stored body has formatting, links or images its plain text would lose."""
+    if format == "plain" or not content:
+        return False
+    if format != "compact" or not content.startswith(COMPACT_HTML_HEADER):
+        return True
+    return RICH_TAG_PATTERN.search(content, len(COMPACT_HTML_HEADER)) is not None
+
+ORDERED_LIST_STYLES = {
+    QTextListFormat.ListDecimal, QTextListFormat.ListLowerAlpha, QTextListFormat.ListUpperAlpha,
+    QTextListFormat.ListLowerRoman, QTextListFormat.ListUpperRoman
+}
+
+def document_to_html(doc):
+    """Serialize a QTextDocument to the compact storage format.
+
+    Keeps paragraphs, headings, lists, bold, italic, underline, strikethrough, point sizes other than the
+    document's default, links and images; setHtml reads the result back into the same document.
+    """
+    if doc.isEmpty():
+        return ""
+    default_size = doc.defaultFont().pointSizeF()
+    parts = [COMPACT_HTML_HEADER]
+    current_list = list_tag = None
+    block = doc.begin()
+    while block.isValid():
+        text_list = block.textList()
+        if text_list is not current_list:
+            if current_list is not None:
+                parts.append(f"</{list_tag}>")
+            current_list = text_list
+            if text_list is not None:
+                list_format = text_list.format()
+                list_tag = "ol" if list_format.style() in ORDERED_LIST_STYLES else "ul"
+                indent = list_format.indent()
+                parts.append(f'<{list_tag} style="-qt-list-indent:{indent}">' if indent > 1 else f"<{list_tag}>")
+        block_format = block.blockFormat()
+        heading = block_format.headingLevel()
+        tag = "li" if text_list is not None else f"h{heading}" if heading else "p"
+        margins = ";".join(
+            f"margin-{side}:{value:g}px" for side, value in (
+                ("top", block_format.topMargin()), ("bottom", block_format.bottomMargin()), ("left", block_format.leftMargin())
+            ) if value
+        )
+        attributes = f' style="{margins}"' if margins else ""
+        if block.length() == 1 and text_list is None:
+            parts.append(f'<{tag} class="e"{attributes}></{tag}>')
+            block = block.next()
+            continue
+        parts.append(f"<{tag}{attributes}>")
+        fragments = block.begin()
+        while not fragments.atEnd():
+            fragment = fragments.fragment()
+            fmt = fragment.charFormat()
+            text = fragment.text()
+            if fmt.isImageFormat():
+                image = fmt.toImageFormat()
+                size = "".join(f' {name}="{value:g}"' for name, value in (("width", image.width()), ("height", image.height())) if value > 0)
+                parts.append(f'<img src="{html.escape(image.name())}"{size}>' * len(text))
+            else:
+                closing = []
+                if fmt.isAnchor() and fmt.anchorHref():
+                    parts.append(f'<a href="{html.escape(fmt.anchorHref())}">')
+                    closing.append("</a>")
+                size = fmt.fontPointSize()
+                if size > 0 and size != default_size:
+                    parts.append(f'<span style="font-size:{size:g}pt">')
+                    closing.append("</span>")
+                # Headings are bold and links underlined already
+                for enabled, name in (
+                    (fmt.fontWeight() > QFont.Normal and not heading, "b"), (fmt.fontItalic(), "i"),
+                    (fmt.fontUnderline() and not fmt.isAnchor(), "u"), (fmt.fontStrikeOut(), "s")
+                ):
+                    if enabled:
+                        parts.append(f"<{name}>")
+                        closing.append(f"</{name}>")
+                parts.append(html.escape(text, quote=False).replace("\u2028", "<br>"))
+                parts.extend(reversed(closing))
+            fragments += 1
+        parts.append(f"</{tag}>")
+        block = block.next()
+    if current_list is not None:
+        parts.append(f"</{list_tag}>")
+    parts.append("</body>")
+    return "".join(parts)
+
+WORD_PATTERN = re.compile(r"\w+")
+
+def searchable_text(title, text):
+    # What the search index matches against: the lowercased title and plain text, one line apart
+    return f"{title.lower()}\n{text.lower()}"
+
+def word_trigrams(word):
+    # Space-padded so that short words and word boundaries still produce trigrams
+    padded = f" {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def prefix_edit_distance(query, word, limit):
+    """Edit distance between query and the closest prefix of word, or limit + 1 once it exceeds limit.
+
+    Swapping two adjacent letters counts as a single edit.
+    """
+    before = None
+    previous = list(range(len(word) + 1))
+    for i, query_char in enumerate(query, 1):
+        current = [i]
+        for j, word_char in enumerate(word, 1):
+            distance = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (query_char != word_char))
+            if before is not None and j > 1 and query_char == word[j - 2] and query[i - 2] == word_char:
+                distance = min(distance, before[j - 2] + 1)
+            current.append(distance)
+        # A swap reaches back two rows, so the previous one has to be out of reach as well
+        if min(current) > limit and min(previous) >= limit:
+            return limit + 1
+        before, previous = previous, current
+    return min(previous)
+
+# One condition of a search bar query. field is "text", "title", "modified" or "tag"; for "modified",
+# value is a (lower, upper) pair of "yyyy-MM-dd" bounds, either of which may be None, and for "tag"
+# it is a tuple of tags, any of which will do.
+SearchClause = namedtuple("SearchClause", ["field", "value", "negated", "exact"])
+
+# The bare value may be empty, so "-" and "title:" on their own parse as empty clauses rather than as text
+QUERY_TOKEN_PATTERN = re.compile(r'(-?)(?:(title|modified|tag):)?(?:"([^"]*)"?|(\S*))')
+DATE_CLAUSE_PATTERN = re.compile(r'(>=|<=|>|<|=)?(\d{4}-\d{2}-\d{2})$')
+
+def parse_date_range(value):
+    # Turn ">2026-01-01" style comparisons into half-open day bounds, or None if value is not a date
+    match = DATE_CLAUSE_PATTERN.match(value)
+    if not match:
+        return None
+    op, day = match.group(1) or "=", match.group(2)
+    try:
+        next_day = (datetime.strptime(day, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+    except ValueError:
+        return None
+    return {
+        ">": (next_day, None),
+        ">=": (day, None),
+        "<": (None, day),
+        "<=": (None, next_day),
+        "=": (day, next_day),
+    }[op]
+
+def parse_search_query(text):
+    """Parse search bar text into a list of SearchClause.
+
+    Whitespace-separated terms must all match; -term excludes, "quoted phrases" match literally,
+    title:term only looks at titles, modified:>2026-01-01 (also <, >=, <=, =) filters by date and
+    tag:name (or tag:name,other for either) filters by tag.
+    """
+    clauses = []
+    for match in QUERY_TOKEN_PATTERN.finditer(text.strip()):
+        negated, field, quoted, bare = bool(match.group(1)), match.group(2) or "text", match.group(3), match.group(4)
+        value = (quoted if quoted is not None else bare or "").lower()
+        # Empty clauses ("-", "title:", "tag:") are still being typed and match everything
+        if not value:
+            continue
+        if field == "modified":
+            date_range = parse_date_range(value)
+            if date_range is not None:
+                clauses.append(SearchClause("modified", date_range, negated, True))
+                continue
+            # Not a valid date; search for the literal text instead
+            field, value = "text", match.group(0).lstrip("-").lower()
+        elif field == "tag":
+            tags = tuple(parse_tags(value.replace(",", " ")))
+            if tags:
+                clauses.append(SearchClause("tag", tags, negated, True))
+            continue
+        clauses.append(SearchClause(field, value, negated, quoted is not None))
+    return clauses
+
+def parse_tags(text):
+    """Return the distinct tags in whitespace-separated text, lowercased and without leading #s."""
+    tags = []
+    for word in text.lower().split():
+        tag = word.lstrip("#")
+        if tag and tag not in tags:
+            tags.append(tag)
+    return tags
+
+class TagIndex:
+    """Tags of each note, with the notes carrying each tag as a bitset.
+
+    Tagged notes get small integer ordinals, reused once a note loses its last tag, and a tag's notes
+    are an int with their ordinals' bits set. Tag filters are then a few bitwise operations on those
+    ints, however many notes there are, and never look at note bodies.
+    """
+
+    def __init__(self):
+        self.note_tags = {}  # Note id -> frozenset of tags
+        self.bits = {}  # Tag -> bitset of note ordinals
+        self.ordinals = {}  # Note id -> ordinal
+        self.note_ids = []  # Ordinal -> note id, or None while free
+        self.free_ordinals = []
+
+    def tags_of(self, note_id):
+        return self.note_tags.get(note_id, frozenset())
+
+    def all_tags(self):
+        return sorted(self.bits)
+
+    def set_tags(self, note_id, tags):
+        tags = frozenset(tags)
+        old_tags = self.tags_of(note_id)
+        if tags == old_tags:
+            return
+        ordinal = self.ordinals.get(note_id)
+        if ordinal is None:
+            ordinal = self.free_ordinals.pop() if self.free_ordinals else len(self.note_ids)
+            if ordinal == len(self.note_ids):
+                self.note_ids.append(note_id)
+            else:
+                self.note_ids[ordinal] = note_id
+            self.ordinals[note_id] = ordinal
+        bit = 1 << ordinal
+        for tag in old_tags - tags:
+            remaining = self.bits[tag] & ~bit
+            if remaining:
+                self.bits[tag] = remaining
+            else:
+                del self.bits[tag]
+        for tag in tags - old_tags:
+            self.bits[tag] = self.bits.get(tag, 0) | bit
+        if tags:
+            self.note_tags[note_id] = tags
+        else:
+            del self.note_tags[note_id]
+            del self.ordinals[note_id]
+            self.note_ids[ordinal] = None
+            self.free_ordinals.append(ordinal)
+
+    def remove(self, note_id):
+        self.set_tags(note_id, ())
+
+    # Binary digits to 0/1 bytes, so a bitset can select note ids without a Python-level loop over its bits
+    BIT_SELECTORS = bytes.maketrans(b"01", b"\x00\x01")
+
+    def note_ids_of(self, bits):
+        selectors = f"{bits:b}".encode("ascii")[::-1].translate(self.BIT_SELECTORS)
+        return set(itertools.compress(self.note_ids, selectors))
+
+    def query(self, clauses):
+        """Evaluate tag clauses; return the ids of notes they require (None if no clause requires any) and exclude."""
+        required = None
+        excluded = 0
+        for clause in clauses:
+            bits = 0
+            for tag in clause.value:
+                bits |= self.bits.get(tag, 0)
+            if clause.negated:
+                excluded |= bits
+            else:
+                required = bits if required is None else required & bits
+        if required is None:
+            return None, self.note_ids_of(excluded)
+        return self.note_ids_of(required & ~excluded), set()
+
+class _PackedSets(dict):
+    """A dict of sets loaded from a saved search index, which unpacks each set the first time it is used.
+
+    Until then a key maps to its position in offsets, and its members are data[offsets[i]:offsets[i + 1]]:
+    an array of note ids, or words separated by spaces.
+    """
+
+    def __init__(self, keys, offsets, data):
+        super().__init__(zip(keys, range(len(keys))))
+        self.offsets = offsets
+        self.data = data
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        if type(value) is int:
+            value = self.packed(value)
+            value = set(value.split()) if isinstance(value, str) else set(value)
+            super().__setitem__(key, value)
+        return value
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def items(self):
+        return ((key, self[key]) for key in self)
+
+    def values(self):
+        return (self[key] for key in self)
+
+    def packed(self, position):
+        return self.data[self.offsets[position]:self.offsets[position + 1]]
+
+def _pack_sets(sets, words=False):
+    """Flatten a dict of sets of note ids, or with words of words, into (keys, offsets, data) for _PackedSets.
+
+    Sets still packed in a _PackedSets, and words already joined into a string, are copied over as they are.
+    """
+    keys = list(sets)
+    offsets = array.array("q", [0])
+    data = [] if words else array.array("I")
+    size = 0
+    for key in keys:
+        value = dict.get(sets, key)
+        if type(value) is int:
+            value = sets.packed(value)
+        elif words and not isinstance(value, str):
+            value = " ".join(value)
+        if words:
+            data.append(value)
+            size += len(value)
+        else:
+            data.extend(value)
+            size = len(data)
+        offsets.append(size)
+    return keys, offsets, "".join(data) if words else data
+
+class SearchIndex:
+    """Inverted index over note titles and plain text.
+
+    Words map to the ids of the notes containing them, and a trigram index over the vocabulary
+    turns substring and typo-tolerant lookups into a handful of set operations on candidate words,
+    so only those candidates are ever verified.
+    """
+
+    def __init__(self):
+        self.texts = {}  # Note id -> lowercased "title\nplain text", filled in from text_source when missing
+        self.text_source = None  # Note id -> (title, plain text), for notes indexed without their text
+        self.titles = {}  # Note id -> lowercased title
+        self.note_words = {}  # Note id -> set of words, from the saved index or filled in from texts on first use
+        self.postings = {}  # Word -> set of note ids
+        self.title_postings = {}  # Word -> set of ids of notes with that word in their title
+        self.modified = {}  # Note id -> "yyyy-MM-dd HH:mm:ss" modification key
+        self.modified_order = []  # Sorted (modification key, note id) pairs for range scans
+        self.trigrams = {}  # Trigram -> set of words in the vocabulary
+        self.word_cache = {}  # (fragment, max distance) -> matching words, valid until the vocabulary changes
+
+    # Bump when the attributes above or the file layout change, so index files written by older versions are rebuilt
+    FILE_FORMAT = 3
+
+    def dump(self, versions):
+        """Serialize the index, with versions, the {note id: version} of the notes as they were indexed.
+
+        Texts are left out; they come back from the note bodies as searches need them. Postings, trigrams
+        and each note's words are written as flat runs that load takes in whole and only unpacks set by set
+        as they are used. Safe to run on another thread as long as nothing adds or removes notes meanwhile.
+        """
+        state = {
+            "titles": self.titles,
+            "title_postings": self.title_postings,
+            "modified_order": self.modified_order,
+            "postings": _pack_sets(self.postings),
+            "trigrams": _pack_sets(self.trigrams, words=True),
+            "note_words": _pack_sets({note_id: self._packed_words(note_id) for note_id in list(self.modified)}, words=True),
+        }
+        return pickle.dumps((self.FILE_FORMAT, versions, state), protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path):
+        """Return (index, versions) from a file written with dump, or None if it is missing or unusable."""
+        try:
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                file_format, versions, state = pickle.loads(mapped)
+            if file_format != cls.FILE_FORMAT:
+                return None
+            index = cls()
+            index.titles = state["titles"]
+            index.title_postings = state["title_postings"]
+            index.modified_order = state["modified_order"]
+            index.modified = {note_id: modified for modified, note_id in index.modified_order}
+            index.postings = _PackedSets(*state["postings"])
+            index.trigrams = _PackedSets(*state["trigrams"])
+            index.note_words = _PackedSets(*state["note_words"])
+        except Exception:
+            # Missing, empty, truncated or from another version: the caller rebuilds it
+            return None
+        return index, versions
+
+    def _packed_words(self, note_id):
+        # A note's words for dump, without unpacking or caching anything
+        words = dict.get(self.note_words, note_id)
+        if type(words) is int:
+            return self.note_words.packed(words)
+        if words is None:
+            words = set(WORD_PATTERN.findall(self.text(note_id, cache=False) or ""))
+        return words
+
+    def text(self, note_id, cache=True):
+        """Return the searchable text of an indexed note, or None."""
+        searchable = self.texts.get(note_id)
+        if searchable is None and self.text_source is not None and note_id in self.modified:
+            searchable = searchable_text(*self.text_source(note_id))
+            if cache:
+                self.texts[note_id] = searchable
+        return searchable
+
+    def add_many(self, entries):
+        """Add or update notes from (id, title, searchable text, words, modified) entries.
+
+        Into an empty index this does the work of add for all of them at once: the modification order is
+        sorted a single time, and trigrams are only made for the words that are new to the vocabulary.
+        """
+        if self.modified:
+            for note_id, title, searchable, words, modified in entries:
+                self._add(note_id, title.lower(), searchable, set(words), modified)
+            return
+        new_words = []
+        postings = self.postings
+        for note_id, title, searchable, words, modified in entries:
+            self._set_title(note_id, title.lower())
+            self.modified[note_id] = modified
+            self.texts[note_id] = searchable
+            for word in words:
+                ids = postings.get(word)
+                if ids is None:
+                    postings[word] = {note_id}
+                    new_words.append(word)
+                else:
+                    ids.add(note_id)
+        self.modified_order = sorted((modified, note_id) for note_id, modified in self.modified.items())
+        for word in new_words:
+            self._add_trigrams(word)
+        self.word_cache.clear()
+
+    def add(self, note_id, title, text, modified):
+        searchable = searchable_text(title, text)
+        self._add(note_id, title.lower(), searchable, set(WORD_PATTERN.findall(searchable)), modified)
+
+    def _add(self, note_id, title, searchable, words, modified):
+        old_words = self._words_of(note_id)
+        if self.titles.get(note_id) != title:
+            self._set_title(note_id, title)
+        if self.modified.get(note_id) != modified:
+            self._set_modified(note_id, modified)
+        self.texts[note_id] = searchable
+        self.note_words[note_id] = words
+        # Only the words that appeared or disappeared touch the postings
+        for word in old_words - words:
+            self._remove_posting(word, note_id)
+        for word in words - old_words:
+            ids = self.postings.get(word)
+            if ids is None:
+                self.postings[word] = {note_id}
+                self._add_trigrams(word)
+                self.word_cache.clear()
+            else:
+                ids.add(note_id)
+
+    def remove(self, note_id):
+        if note_id not in self.modified:
+            return
+        words = self._words_of(note_id)
+        self.note_words.pop(note_id, None)
+        self.texts.pop(note_id, None)
+        self._set_title(note_id, None)
+        self._set_modified(note_id, None)
+        for word in words:
+            self._remove_posting(word, note_id)
+
+    def _add_trigrams(self, word):
+        for gram in word_trigrams(word):
+            self.trigrams.setdefault(gram, set()).add(word)
+
+    def _words_of(self, note_id):
+        words = self.note_words.get(note_id)
+        if words is None:
+            text = self.text(note_id)
+            words = set(WORD_PATTERN.findall(text)) if text is not None else set()
+        return words
+
+    def _set_title(self, note_id, title):
+        old_title = self.titles.pop(note_id, None)
+        if old_title is not None:
+            for word in set(WORD_PATTERN.findall(old_title)):
+                ids = self.title_postings[word]
+                ids.discard(note_id)
+                if not ids:
+                    del self.title_postings[word]
+        if title is not None:
+            self.titles[note_id] = title
+            for word in WORD_PATTERN.findall(title):
+                self.title_postings.setdefault(word, set()).add(note_id)
+
+    def _set_modified(self, note_id, modified):
+        old_modified = self.modified.pop(note_id, None)
+        if old_modified is not None:
+            position = bisect.bisect_left(self.modified_order, (old_modified, note_id))
+            del self.modified_order[position]
+        if modified is not None:
+            self.modified[note_id] = modified
+            bisect.insort(self.modified_order, (modified, note_id))
+
+    def _remove_posting(self, word, note_id):
+        ids = self.postings[word]
+        ids.discard(note_id)
+        if not ids:
+            del self.postings[word]
+            for gram in word_trigrams(word):
+                words = self.trigrams[gram]
+                words.discard(word)
+                if not words:
+                    del self.trigrams[gram]
+            self.word_cache.clear()
+
+    def words_containing(self, fragment):
+        key = (fragment, 0)
+        if key not in self.word_cache:
+            if len(fragment) < 3:
+                words = [word for word in self.postings if fragment in word]
+            else:
+                grams = sorted((self.trigrams.get(fragment[i:i + 3], set()) for i in range(len(fragment) - 2)), key=len)
+                candidates = set.intersection(*grams)
+                words = [word for word in candidates if fragment in word]
+            self.word_cache[key] = words
+        return self.word_cache[key]
+
+    def words_near(self, fragment):
+        # Short fragments only match exactly; longer ones tolerate one or two typos
+        max_distance = 0 if len(fragment) < 4 else 1 if len(fragment) < 8 else 2
+        if not max_distance:
+            return self.words_containing(fragment)
+        key = (fragment, max_distance)
+        if key not in self.word_cache:
+            # Each edit destroys at most four trigrams (a swap of two letters), so a match has to share the rest
+            grams = word_trigrams(fragment)
+            overlap = Counter()
+            for gram in grams:
+                overlap.update(self.trigrams.get(gram, ()))
+            # The closing trigram, padded at the end, cannot match when fragment is a prefix of a longer word
+            required = max(len(grams) - 4 * max_distance - 1, 1)
+            words = set(self.words_containing(fragment))
+            for word, shared in overlap.items():
+                if shared >= required and word not in words and len(word) >= len(fragment) - max_distance:
+                    if prefix_edit_distance(fragment, word, max_distance) <= max_distance:
+                        words.add(word)
+            self.word_cache[key] = list(words)
+        return self.word_cache[key]
+
+    def _notes_with_any(self, words, postings):
+        if len(words) == 1:
+            return postings.get(words[0], set())
+        return set().union(*(postings.get(word, ()) for word in words))
+
+    def search(self, fragment, titles_only=False):
+        """Return the ids of notes whose title or text (or only title) contains fragment."""
+        fragment = fragment.lower()
+        text_of = self.titles.get if titles_only else self.text
+        postings = self.title_postings if titles_only else self.postings
+        tokens = WORD_PATTERN.findall(fragment)
+        if not tokens:
+            # Nothing for the index to narrow down; scanning every body for punctuation would mean extracting
+            # the text of every note on each keystroke, so only titles are searched
+            return {note_id for note_id, title in self.titles.items() if fragment in title}
+        candidates = None
+        for token in sorted(set(tokens), key=len, reverse=True):
+            ids = self._notes_with_any(self.words_containing(token), postings)
+            candidates = set(ids) if candidates is None else candidates & ids
+            if not candidates:
+                return set()
+        if fragment == tokens[0]:
+            return candidates
+        return {note_id for note_id in candidates if fragment in text_of(note_id)}
+
+    def modified_between(self, lower, upper):
+        """Return the ids of notes modified at or after day lower and before day upper."""
+        start = 0 if lower is None else bisect.bisect_left(self.modified_order, (lower,))
+        end = len(self.modified_order) if upper is None else bisect.bisect_left(self.modified_order, (upper,))
+        return {note_id for _, note_id in self.modified_order[start:end]}
+
+    def query(self, clauses, fuzzy=False, within=None):
+        """Evaluate parsed search clauses as set operations and return the matching note ids.
+
+        within, a set of note ids, limits the matches to those notes.
+        """
+        positive = [] if within is None else [within]
+        negative = []
+        for clause in clauses:
+            if clause.field == "modified":
+                ids = self.modified_between(*clause.value)
+            elif fuzzy and not clause.exact:
+                ids = self.fuzzy_search(clause.value, titles_only=clause.field == "title")
+            else:
+                ids = self.search(clause.value, titles_only=clause.field == "title")
+            (negative if clause.negated else positive).append(ids)
+        if positive:
+            positive.sort(key=len)
+            matches = set(positive[0]).intersection(*positive[1:])
+        else:
+            matches = set(self.modified)
+        for ids in negative:
+            if not matches:
+                break
+            matches -= ids
+        return matches
+
+    def fuzzy_search(self, fragment, titles_only=False):
+        """Return the ids of notes containing every word of fragment, allowing small typos."""
+        tokens = WORD_PATTERN.findall(fragment.lower())
+        if not tokens:
+            return self.search(fragment, titles_only)
+        postings = self.title_postings if titles_only else self.postings
+        candidates = None
+        for token in sorted(set(tokens), key=len, reverse=True):
+            ids = self._notes_with_any(self.words_near(token), postings)
+            candidates = set(ids) if candidates is None else candidates & ids
+            if not candidates:
+                return set()
+        return candidates
+
+def spawn_context():
+    # Spawned rather than forked: a fork of this process would inherit Qt's and SQLite's threads half-way
+    return multiprocessing.get_context("spawn")
+
+def index_chunk(rows):
+    """Return (id, searchable text, words, linked titles) for each (id, title, content, ...) row.
+
+    Runs in a Reindexer worker process. The distinct words come back joined by spaces, as one string
+    unpickles much faster than a set of them.
+    """
+    entries = []
+    for note_id, title, content, *_ in rows:
+        searchable = searchable_text(title, html_to_text(content))
+        entries.append((note_id, searchable, " ".join(set(WORD_PATTERN.findall(searchable))), extract_note_links(content)))
+    return entries
+
+@functools.lru_cache(maxsize=64)
+def compile_search_pattern(pattern):
+    """Compile a regular expression search bar query; raises re.error if it is not valid."""
+    # The search index keeps text lowercased, so matching ignores case either way
+    return re.compile(pattern, re.IGNORECASE | re.MULTILINE)
+
+def regex_worker(commands, results, chunk_chars):
+    """Keep one shard of the notes' text and scan it for each regular expression RegexSearch sends.
+
+    Runs in a RegexSearch worker process until it reads None from commands. ("update", {id: text}, removed
+    ids) changes the shard, a text being either plain or a (title, body) pair to extract it from on first
+    use; ("scan", search number, pattern) scans it. Every chunk_chars or so of text scanned, the matches
+    so far are sent to results as (search number, ids, None), and the scan is dropped if another command
+    has come in; it ends with (search number, ids, whether the whole shard was scanned).
+    """
+    texts = {}
+    pending = []  # A command read during a scan, which cuts the scan short
+    while True:
+        command = pending.pop() if pending else commands.get()
+        if command is None:
+            return
+        if command[0] == "update":
+            _, changed, removed = command
+            texts.update(changed)
+            for note_id in removed:
+                texts.pop(note_id, None)
+        elif command[0] == "scan":
+            _, number, pattern = command
+            compiled = compile_search_pattern(pattern)
+            matches, size = [], 0
+            for note_id, text in texts.items():
+                if not isinstance(text, str):
+                    text = texts[note_id] = searchable_text(text[0], html_to_text(text[1]))
+                if compiled.search(text):
+                    matches.append(note_id)
+                size += len(text)
+                if size >= chunk_chars:
+                    results.send((number, matches, None))
+                    matches, size = [], 0
+                    try:
+                        pending.append(commands.get_nowait())
+                        break
+                    except queue.Empty:
+                        pass
+            results.send((number, matches, not pending))
+
+def write_file_atomically(path, data):
+    # Write next to the target and swap it in, so a crash never leaves a half-written file behind
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+def rewrite_note_links(content, old_title, new_title):
+    """Point every link to old_title in a note body at new_title instead."""
+    old_text = html.escape(old_title, quote=False)
+    new_text = html.escape(new_title, quote=False)
+    content = content.replace(f"[[{old_text}]]", f"[[{new_text}]]")
+
+    def anchor_replacer(match):
+        if html.unescape(match.group(2)) != old_title:
+            return match.group(0)
+        href = html.escape(new_title)
+        label = match.group(4).replace(old_text, new_text)
+        return f"{match.group(1)}note:{href}{match.group(3)}{label}{match.group(5)}"
+    return NOTE_ANCHOR_PATTERN.sub(anchor_replacer, content)
+
+def scan_sync_folder(folder, files, skipped_files, extensions):
+    """Find the files of a sync folder that changed since the last sync.
+
+    Runs off the GUI thread. files maps the name of each synced file to its (mtime_ns, size, hash) as of
+    the last sync, and skipped_files holds the (mtime_ns, size) of files left out. Returns None if the
+    folder cannot be listed, or the names seen, (name, mtime_ns, size, hash, data) for each file whose stat
+    changed, data being None if its content did not, and the names of synced files that are gone.
+    """
+    try:
+        entries = list(os.scandir(folder))
+    except OSError:
+        return None
+    seen = set()
+    changed = []
+    for entry in entries:
+        name = entry.name
+        if name.startswith(".") or not name.lower().endswith(extensions) or not entry.is_file():
+            continue
+        seen.add(name)
+        try:
+            stat = entry.stat()
+            cached = files.get(name)
+            if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+                continue
+            if skipped_files.get(name) == (stat.st_mtime_ns, stat.st_size):
+                continue
+            with open(entry.path, "rb") as f:
+                data = f.read()
+        except OSError:
+            continue
+        digest = hashlib.sha1(data).hexdigest()
+        # A file that was only touched needs no import
+        changed.append((name, stat.st_mtime_ns, stat.st_size, digest, None if cached and cached[2] == digest else data))
+    # A name the folder lists in another case, on a filesystem that ignores case, is still there
+    missing = [name for name in files if name not in seen and not os.path.exists(os.path.join(folder, name))]
+    return seen, changed, missing
+
+def write_sync_files(folder, exports):
+    """Write notes out to a sync folder as plain text.
+
+    Runs off the GUI thread. exports holds (note id, old file name or None, file name, body) for each note;
+    returns (note id, old file name, file name, mtime_ns, size, hash) for each file written.
+    """
+    written = []
+    for note_id, old_name, filename, content in exports:
+        path = os.path.join(folder, filename)
+        data = html_to_text(content).encode("utf-8")
+        try:
+            renamed = old_name and old_name != filename
+            old_path = os.path.join(folder, old_name) if renamed else None
+            if renamed and os.path.exists(path) and os.path.exists(old_path) and os.path.samefile(old_path, path):
+                # Only the case changed, on a filesystem that ignores case: rename the file itself, since
+                # removing the old name afterwards would remove the new file
+                os.rename(old_path, path)
+                renamed = False
+            # Write next to the target and swap it in, so readers never see a half-written file
+            temp_path = os.path.join(folder, f".{filename}.tmp")
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+            if renamed:
+                try:
+                    os.remove(old_path)
+                except FileNotFoundError:
+                    pass
+            stat = os.stat(path)
+        except OSError:
+            continue
+        written.append((note_id, old_name, filename, stat.st_mtime_ns, stat.st_size, hashlib.sha1(data).hexdigest()))
+    return written
+
+# Backups are named after the time they were taken, so sorting by name sorts by age
+BACKUP_NAME_PATTERN = re.compile(r'notes-\d{8}-\d{6}\.db$')
+
+def finish_backup(partial_path, path, keep):
+    """Verify a freshly copied backup, move it into place and delete all but the newest keep backups.
+
+    Runs off the GUI thread; returns the path of the new backup.
+    """
+    try:
+        conn = sqlite3.connect(partial_path)
+        try:
+            # A backup should be one self-contained file, not a database plus its write-ahead log
+            conn.execute("PRAGMA journal_mode=DELETE")
+            result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+            conn.execute("SELECT COUNT(*) FROM notes").fetchone()
+        finally:
+            conn.close()
+        if result != "ok":
+            raise sqlite3.DatabaseError(f"the copy failed verification ({result})")
+        os.replace(partial_path, path)
+    except Exception:
+        for leftover in (partial_path, partial_path + "-wal", partial_path + "-shm"):
+            try:
+                os.remove(leftover)
+            except OSError:
+                pass
+        raise
+    folder = os.path.dirname(path)
+    backups = sorted(name for name in os.listdir(folder) if BACKUP_NAME_PATTERN.match(name))
+    for name in backups[:-max(keep, 1)]:
+        os.remove(os.path.join(folder, name))
+    return path
+
+class WriteConflict(Exception):
+    """A write was rolled back because another instance changed the same notes first."""
+
+class DatabaseService(QObject):
+    """Runs all SQLite I/O off the GUI thread.
+
+    A single writer thread owns the only connection that writes. Write requests run strictly in the
+    order they were queued, each in its own transaction, so a write is never committed before one
+    queued ahead of it. Queries run on a small pool of read-only connections. Both kinds of request
+    return a concurrent.futures.Future; callback and on_error, if given, are called on the GUI thread.
+    """
+    completed = pyqtSignal(object, object, object)  # callback, on_error, future
+    failed = pyqtSignal(str)
+    BUSY_TIMEOUT = 30  # Seconds to wait for a lock held by another instance
+
+    def __init__(self, path, readers=2, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.requests = queue.Queue()
+        self.reader_pool = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="notes-db-reader")
+        self.reader_local = threading.local()
+        self.reader_connections = []
+        self.completed.connect(self._deliver)
+        self.writer = threading.Thread(target=self._write_loop, name="notes-db-writer", daemon=True)
+        self.writer.start()
+
+    def write(self, fn, *args, callback=None, on_error=None):
+        """Queue fn(connection, *args) to run in its own transaction on the writer thread."""
+        future = Future()
+        self.requests.put((fn, args, future, callback, on_error))
+        return future
+
+    def read(self, fn, *args, callback=None, on_error=None):
+        """Run fn(connection, *args) on one of the read-only connections."""
+        return self.submit(self._read, fn, args, callback=callback, on_error=on_error)
+
+    def submit(self, fn, *args, callback=None, on_error=None):
+        """Run fn(*args) on the reader pool, for slow work that needs no connection to notes.db."""
+        future = self.reader_pool.submit(fn, *args)
+        future.add_done_callback(lambda done: self.completed.emit(callback, on_error, done))
+        return future
+
+    def backup(self, target, pages=256, callback=None, on_error=None):
+        """Copy the database to the file target with the SQLite online backup API.
+
+        The copy is made on the writer connection, pages at a time. Writes queued meanwhile run between
+        two steps, so autosave never waits for a backup, and SQLite applies them to the copy as well,
+        which keeps it consistent without restarting.
+        """
+        def copy(conn):
+            dest = sqlite3.connect(target)
+            try:
+                conn.backup(dest, pages=pages, progress=lambda status, remaining, total: self.run_queued_writes(conn))
+            finally:
+                dest.close()
+            return target
+        return self.write(copy, callback=callback, on_error=on_error)
+
+    def run_queued_writes(self, conn):
+        # Called from inside a long job on the writer thread to let the writes queued behind it through
+        while True:
+            try:
+                request = self.requests.get_nowait()
+            except queue.Empty:
+                return
+            if request is None:
+                # close() was called; leave the sentinel for the writer loop
+                self.requests.put(None)
+                return
+            self._run(conn, request)
+
+    def close(self):
+        """Commit the writes still queued, then close every connection."""
+        self.requests.put(None)
+        self.writer.join()
+        self.reader_pool.shutdown(wait=True)
+        for conn in self.reader_connections:
+            conn.close()
+
+    def _write_loop(self):
+        conn = sqlite3.connect(self.path, timeout=self.BUSY_TIMEOUT)
+        while True:
+            request = self.requests.get()
+            if request is None:
+                break
+            self._run(conn, request)
+        conn.close()
+
+    def _run(self, conn, request):
+        fn, args, future, callback, on_error = request
+        try:
+            with conn:
+                future.set_result(fn(conn, *args))
+        except Exception as error:
+            future.set_exception(error)
+        self.completed.emit(callback, on_error, future)
+
+    def _read(self, fn, args):
+        conn = getattr(self.reader_local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(Path(self.path).as_uri() + "?mode=ro", uri=True, timeout=self.BUSY_TIMEOUT, check_same_thread=False)
+            self.reader_local.conn = conn
+            self.reader_connections.append(conn)
+        return fn(conn, *args)
+
+    def _deliver(self, callback, on_error, future):
+        error = future.exception()
+        if error is not None:
+            if on_error is not None:
+                on_error(error)
+            else:
+                self.failed.emit(str(error))
+        elif callback is not None:
+            callback(future.result())
+
+def create_schema(conn):
+    """Create or upgrade the schema of notes.db; returns the connection's data_version baseline.
+
+    Runs on the database writer thread.
+    """
+    # Free pages can only be handed back a few at a time if this is set before any table exists
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS notes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            content TEXT NOT NULL,
+            modified TEXT NOT NULL
+        )
+    """)
+    # Link index: one row per (note, linked title), so inbound links are found without scanning bodies
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS note_links (
+            source_id INTEGER NOT NULL,
+            target_title TEXT NOT NULL,
+            PRIMARY KEY (source_id, target_title)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS note_links_target ON note_links (target_title)")
+    # Tags: one row per (note, tag), lowercased
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS note_tags (
+            note_id INTEGER NOT NULL,
+            tag TEXT NOT NULL,
+            PRIMARY KEY (note_id, tag)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS note_tags_tag ON note_tags (tag)")
+    # Change log: every write to notes, from any connection, gives the note a new, monotonically increasing
+    # sequence number. Only each note's latest one is kept, so the log never outgrows the notes.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            note_id INTEGER NOT NULL UNIQUE
+        )
+    """)
+    # Images pasted into notes, stored once per distinct content and referenced from bodies as blob:<hash>
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS blobs (
+            hash TEXT PRIMARY KEY,
+            data BLOB NOT NULL,
+            added TEXT NOT NULL
+        )
+    """)
+    # Which note shows which image, so unused images are found without scanning bodies
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS note_blobs (
+            note_id INTEGER NOT NULL,
+            hash TEXT NOT NULL,
+            PRIMARY KEY (note_id, hash)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS note_blobs_hash ON note_blobs (hash)")
+    # Folder sync state: which file mirrors which note, with the stat and hash seen at the last sync
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sync_files (
+            note_id INTEGER PRIMARY KEY,
+            filename TEXT NOT NULL UNIQUE,
+            mtime_ns INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            hash TEXT NOT NULL
+        )
+    """)
+    migrate_db(conn)
+    # REPLACE drops the note's previous row, so its new sequence number is the only one left
+    conn.execute("CREATE TRIGGER IF NOT EXISTS notes_log_insert AFTER INSERT ON notes BEGIN INSERT OR REPLACE INTO change_log (note_id) VALUES (NEW.id); END")
+    conn.execute("CREATE TRIGGER IF NOT EXISTS notes_log_update AFTER UPDATE ON notes BEGIN INSERT OR REPLACE INTO change_log (note_id) VALUES (NEW.id); END")
+    conn.execute("CREATE TRIGGER IF NOT EXISTS notes_log_delete AFTER DELETE ON notes BEGIN INSERT OR REPLACE INTO change_log (note_id) VALUES (OLD.id); END")
+    return conn.execute("PRAGMA data_version").fetchone()[0]
+
+def migrate_db(conn):
+    """Upgrade the schema of a database written by an older version, tracked in PRAGMA user_version.
+
+    Each step commits together with its version bump, so a step cut short is rolled back and runs again in
+    full next time. The version is read again once the write lock is held, in case another instance has
+    run the step meanwhile.
+    """
+    def build_link_index():
+        # Build the link index for notes saved before it existed
+        rows = conn.execute("SELECT id, content FROM notes").fetchall()
+        conn.executemany(
+            "INSERT OR IGNORE INTO note_links (source_id, target_title) VALUES (?, ?)",
+            [(row_id, title) for row_id, content in rows for title in extract_note_links(content)]
+        )
+
+    def add_versions():
+        # Per-note version token for optimistic concurrency between instances
+        conn.execute("ALTER TABLE notes ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+    def add_formats():
+        # Storage format of the body: "html" for Qt's toHtml output, "compact" for document_to_html.
+        # Existing notes are converted in the background after loading, or marked "rich" and kept in
+        # Qt's HTML if converting would lose formatting.
+        conn.execute("ALTER TABLE notes ADD COLUMN format TEXT NOT NULL DEFAULT 'html'")
+
+    def collapse_change_log():
+        # The change log kept a row per write; collapse it to each note's latest sequence number
+        for trigger in ("notes_log_insert", "notes_log_update", "notes_log_delete"):
+            conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        conn.execute("CREATE TABLE change_log_collapsed (seq INTEGER PRIMARY KEY AUTOINCREMENT, note_id INTEGER NOT NULL UNIQUE)")
+        conn.execute("INSERT INTO change_log_collapsed (seq, note_id) SELECT MAX(seq), note_id FROM change_log GROUP BY note_id")
+        conn.execute("DROP TABLE change_log")
+        conn.execute("ALTER TABLE change_log_collapsed RENAME TO change_log")
+
+    def build_image_references():
+        # Build the image references for notes saved before they were tracked
+        for row_id, content in conn.execute("SELECT id, content FROM notes WHERE instr(content, 'blob:')").fetchall():
+            update_note_blobs(conn, row_id, content)
+
+    steps = [build_link_index, add_versions, add_formats, collapse_change_log, build_image_references]
+    for version, step in enumerate(steps, 1):
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= version:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("PRAGMA user_version").fetchone()[0] < version:
+                step()
+                conn.execute(f"PRAGMA user_version = {version}")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Notational Celerity")
         self.resize(800, 600)
         self.note_selected = False
-        self.notes = []  # List of dicts: {"title": str, "content": str, "modified": QDateTime}
+        self.notes = []  # List of dicts: {"id": int, "title": str, "content": str, "modified": QDateTime, "version": int}
+        self.outbound_links = {}  # Note id -> set of titles that note links to
+        self.backlinks = {}  # Title -> set of ids of the notes linking to it
+        self.tag_index = TagIndex()
+        self.next_note_id = 1  # Row id for the next note we create
+        self.search_index = SearchIndex()
+        self.search_index_changed = False  # Whether the index differs from the copy on disk
+        self.search_index_rebuild = None  # While the index is rebuilt in the background, ids of the notes changed meanwhile
+        self.search_index_saving = False  # Whether the index is being written to disk on the reader pool
+        self.search_index_deferred = {}  # Meanwhile, note id -> note to index again, or None to remove
+        self.reindexer = None
+        self.regex_search = RegexSearch(self, self.get_settings().value("search/regex_seconds", 5, type=int))
+        self.regex_search.matched.connect(self.on_regex_matched)
+        self.regex_search.finished.connect(self.on_regex_search_finished)
+        self.regex_pattern = None  # Pattern of the last regular expression search
+        self.regex_matches = set()  # Ids of the notes it has matched so far
+        self.regex_found = set()  # Ids matched by the scan in progress, which replace regex_matches once it completes
+        self.regex_update_timer = QTimer(self)
+        self.regex_update_timer.setSingleShot(True)
+        self.regex_update_timer.setInterval(100)
+        self.regex_update_timer.timeout.connect(self.show_regex_matches)
+        self.regex_start_timer = QTimer(self)
+        self.regex_start_timer.setSingleShot(True)
+        self.regex_start_timer.setInterval(200)
+        self.regex_start_timer.timeout.connect(self.start_regex_search)
+        self.search_query = []  # Parsed clauses of the current search bar text
         self.filtered_notes = []  # Indices of notes matching the search
         self.current_note_index = None  # Index in self.notes
         self.sort_column = 1  # Default sort by date modified
         self.sort_order = Qt.SortOrder.DescendingOrder
-        self.init_db()
+        self.last_change_seq = 0  # Highest change_log sequence number already reflected in self.notes
+        self.data_version = None
+        self.save_conflict = False  # Set when the open note could not be saved because another instance changed it
+        self.external_check_pending = False
+        self.external_fetch_pending = False
+        self.external_fetch_again = False
+        self.stale_note_ids = set()  # Notes to reload on the next external change fetch
+        self.backup_running = False
+        self.backup_timer = QTimer(self)
+        self.backup_timer.timeout.connect(self.back_up_if_due)
+        self.folder_sync = None
+        self.maintenance = None
+        self.api = None
+        # Notes at least this long open in the plain text editor (and plain ones stay there until they shrink to half)
+        self.large_note_chars = self.get_settings().value("editor/large_note_chars", 256 * 1024, type=int)
+        self.large_note_save_timer = QTimer(self)
+        self.large_note_save_timer.setSingleShot(True)
+        self.large_note_save_timer.setInterval(1000)
+        self.large_note_save_timer.timeout.connect(lambda: self.save_large_note() and self.update_notes_table())
+        self.notes_to_index = {}  # id() of note -> note saved while typing, whose links and index entry are out of date
+        self.index_timer = QTimer(self)
+        self.index_timer.setSingleShot(True)
+        self.index_timer.setInterval(500)
+        self.index_timer.timeout.connect(self.index_typed_notes)
+        self.change_poll_timer = QTimer(self)
+        self.change_poll_timer.timeout.connect(self.check_for_external_changes)
         self.init_ui()
-        self.load_notes_from_db()
+        # Nothing can be edited until the notes have been read
+        self.setEnabled(False)
+        self.init_db()
 
     def init_ui(self):
         central = QWidget()
@@ -102,14 +1309,19 @@ class MainWindow(QMainWindow):
             vheader.setVisible(False)
         splitter.addWidget(self.notes_table)
 
-        self.note_editor = NoteEdit(link_handler=self.handle_note_link)
-        self.note_editor.textChanged.connect(self.auto_save_note)
-        # Set tab stop width to 4 spaces
-        self.note_editor.setTabStopDistance(4 * self.note_editor.fontMetrics().horizontalAdvance(' '))
-        # Initialize editor as disabled (no note selected at startup)
-        self.note_editor.setEnabled(False)
-        self.note_editor.setReadOnly(True)
-        splitter.addWidget(self.note_editor)
+        self.rich_editor = NoteEdit(link_handler=self.handle_note_link)
+        self.plain_editor = PlainNoteEdit(link_handler=self.handle_note_link, link_resolver=self.wiki_link_href)
+        self.note_editor = self.rich_editor  # Whichever of the two is showing
+        self.editor_stack = QStackedWidget()
+        for editor in (self.rich_editor, self.plain_editor):
+            editor.textChanged.connect(self.auto_save_note)
+            # Set tab stop width to 4 spaces
+            editor.setTabStopDistance(4 * editor.fontMetrics().horizontalAdvance(' '))
+            # Initialize editor as disabled (no note selected at startup)
+            editor.setEnabled(False)
+            editor.setReadOnly(True)
+            self.editor_stack.addWidget(editor)
+        splitter.addWidget(self.editor_stack)
 
         splitter.setSizes([200, 400])  # Initial sizes
         layout.addWidget(splitter)
@@ -192,29 +1404,75 @@ class MainWindow(QMainWindow):
         list_item_action.triggered.connect(self.toggle_list_item)
         self.addAction(list_item_action)
 
+        # Formatting has nothing to apply to in the plain text editor
+        self.formatting_actions = [
+            bold_action, italic_action, strike_action, underline_action, increase_size_up_action, decrease_size_down_action,
+            h1_action, h2_action, h3_action, h4_action, h5_action, h6_action, normal_text_action, list_item_action
+        ]
+
+        # Jump between search matches in the open note
+        next_match_action = QAction(self)
+        next_match_action.setShortcuts([QKeySequence.FindNext, QKeySequence("F3")])
+        next_match_action.triggered.connect(lambda: self.note_editor.find_search_match())
+        self.addAction(next_match_action)
+
+        previous_match_action = QAction(self)
+        previous_match_action.setShortcuts([QKeySequence.FindPrevious, QKeySequence("Shift+F3")])
+        previous_match_action.triggered.connect(lambda: self.note_editor.find_search_match(backward=True))
+        self.addAction(previous_match_action)
+
         # Create menu bar with help
         menubar = self.menuBar()
         if menubar:
+            file_menu = menubar.addMenu("File")
+            if file_menu:
+                file_menu.addAction("Sync with Folder...", self.choose_sync_folder)
+                self.stop_sync_action = file_menu.addAction("Stop Folder Sync", self.stop_folder_sync)
+                self.stop_sync_action.setEnabled(False)
+                file_menu.addSeparator()
+                file_menu.addAction("Back Up Now", self.back_up_notes)
+                self.auto_backup_action = file_menu.addAction("Automatic Backups")
+                self.auto_backup_action.setCheckable(True)
+                self.auto_backup_action.setChecked(self.get_settings().value("backup/enabled", True, type=bool))
+                self.auto_backup_action.toggled.connect(self.toggle_auto_backup)
+                file_menu.addAction("Compact Database", self.compact_database)
+                file_menu.addSeparator()
+                self.api_action = file_menu.addAction("Allow Scripting Access")
+                self.api_action.setCheckable(True)
+                self.api_action.setChecked(self.get_settings().value("api/enabled", False, type=bool))
+                self.api_action.toggled.connect(self.toggle_api)
+            search_menu = menubar.addMenu("Search")
+            if search_menu:
+                self.fuzzy_search_action = search_menu.addAction("Fuzzy Matching")
+                self.fuzzy_search_action.setCheckable(True)
+                self.fuzzy_search_action.setChecked(self.get_settings().value("search/fuzzy", False, type=bool))
+                self.fuzzy_search_action.toggled.connect(self.toggle_fuzzy_search)
+                self.regex_search_action = search_menu.addAction("Regular Expressions")
+                self.regex_search_action.setCheckable(True)
+                self.regex_search_action.setChecked(self.get_settings().value("search/regex", False, type=bool))
+                self.regex_search_action.toggled.connect(self.toggle_regex_search)
+                search_menu.addSeparator()
+                search_menu.addAction("Rebuild Search Index", self.rebuild_search_index)
             help_menu = menubar.addMenu("Help")
             if help_menu:
                 help_menu.addAction("Create Tutorial Note", self.show_help)
 
+        # The status bar only shows up while there is something to report
+        status_bar = self.statusBar()
+        status_bar.messageChanged.connect(lambda message: status_bar.setVisible(bool(message)))
+        status_bar.hide()
+
     def on_note_selected(self):
+        self.save_large_note()
+        self.index_typed_notes()
         selected = self.notes_table.selectedItems()
         if selected:
             row = self.notes_table.currentRow()
             if row >= 0 and row < len(self.filtered_notes):
                 self.current_note_index = self.filtered_notes[row]
                 note = self.notes[self.current_note_index]
-                # For empty or minimal content notes, start with clean editor
-                content = note["content"].strip()
-                if not content or content in ["", "<p></p>", "<p><br></p>"]:
-                    self.note_editor.clear()
-                    self.note_editor.setPlainText("")
-                else:
-                    # Load content with rendered links
-                    rendered_content = self.render_links(note["content"])
-                    self.note_editor.setHtml(rendered_content)
+                self.show_note_in_editor(note)
+                self.note_editor.set_search_terms(self.search_highlight_terms())
                 self.note_editor.setEnabled(True)
                 self.note_editor.setReadOnly(False)
                 self.note_selected = True
@@ -233,6 +1491,57 @@ class MainWindow(QMainWindow):
             settings = self.get_settings()
             settings.remove("last_open_note_title")
 
+    def show_note_in_editor(self, note):
+        content = note["content"]
+        # Only bodies that are plain text anyway go to the plain editor, as saving from it drops all formatting
+        if note["format"] == "plain":
+            large = len(content) >= self.large_note_chars // 2
+        else:
+            large = len(content) >= self.large_note_chars and not has_rich_content(content, note["format"])
+        self.use_editor(self.plain_editor if large else self.rich_editor)
+        if large:
+            self.note_editor.setPlainText(html_to_text(content))
+            return
+        if note["format"] == "plain":
+            # A large note that has shrunk again goes back to rich text
+            content = plain_text_to_html(html_to_text(content))
+        # For empty or minimal content notes, start with clean editor
+        if not content.strip() or content.strip() in ["", "<p></p>", "<p><br></p>"]:
+            self.note_editor.clear()
+            self.note_editor.setPlainText("")
+        else:
+            # Load content with rendered links
+            rendered_content = self.render_links(content)
+            self.note_editor.setHtml(rendered_content)
+
+    def use_editor(self, editor):
+        # Show the rich or the plain text editor in place of the other one
+        if editor is self.note_editor:
+            return
+        previous, self.note_editor = self.note_editor, editor
+        had_focus = previous.hasFocus()
+        previous.blockSignals(True)
+        previous.clear()
+        previous.blockSignals(False)
+        previous.setReadOnly(True)
+        previous.setEnabled(False)
+        self.editor_stack.setCurrentWidget(editor)
+        for action in self.formatting_actions:
+            action.setEnabled(editor is self.rich_editor)
+        if had_focus:
+            editor.setFocus()
+
+    def reload_current_note(self):
+        # Refresh the editor from the in-memory note without triggering an auto-save
+        note = self.notes[self.current_note_index]
+        position = self.note_editor.textCursor().position()
+        self.note_editor.blockSignals(True)
+        self.show_note_in_editor(note)
+        self.note_editor.blockSignals(False)
+        cursor = self.note_editor.textCursor()
+        cursor.setPosition(min(position, len(self.note_editor.toPlainText())))
+        self.note_editor.setTextCursor(cursor)
+
     def update_search_icon(self):
         if self.note_selected:
             self.search_icon_action.setIcon(self.pencil_icon)
@@ -253,6 +1562,8 @@ class MainWindow(QMainWindow):
         return super().eventFilter(obj, event)
 
     def exit_note(self):
+        self.save_large_note()
+        self.index_typed_notes()
         if self.note_selected:
             self.notes_table.clearSelection()
             self.note_editor.clear()
@@ -271,6 +1582,7 @@ class MainWindow(QMainWindow):
     def on_search_text_changed(self, text):
         # If user starts typing in search bar while a note is open, exit the note
         if text and self.note_selected:
+            self.save_large_note()
             self.notes_table.clearSelection()
             self.note_editor.clear()
             self.note_editor.setReadOnly(True)
@@ -285,13 +1597,225 @@ class MainWindow(QMainWindow):
             self.notes_table.clearSelection()
 
     def filter_notes(self, text):
-        text = text.strip().lower()
-        self.filtered_notes = []
-        for i, note in enumerate(self.notes):
-            if text in note["title"].lower() or text in note["content"].lower():
-                self.filtered_notes.append(i)
-        if not text:
+        if self.regex_search_action.isChecked():
+            self.filter_notes_by_regex(text.strip())
+            return
+        self.cancel_regex_search()
+        self.search_query = parse_search_query(text)
+        if not self.search_query:
+            self.filtered_notes = list(range(len(self.notes)))
+            return
+        matches = self.query_notes(self.search_query, fuzzy=self.fuzzy_search_action.isChecked())
+        self.filtered_notes = [i for i, note in enumerate(self.notes) if note["id"] in matches]
+
+    def query_notes(self, clauses, fuzzy=False):
+        """Return the ids of the notes matching parsed search clauses."""
+        self.index_typed_notes()
+        tag_clauses = [clause for clause in clauses if clause.field == "tag"]
+        if not tag_clauses:
+            return self.search_index.query(clauses, fuzzy)
+        # Tags narrow the text search down first, so a tag-only query never touches the search index's postings
+        required, excluded = self.tag_index.query(tag_clauses)
+        other_clauses = [clause for clause in clauses if clause.field != "tag"]
+        if other_clauses:
+            matches = self.search_index.query(other_clauses, fuzzy, within=required)
+        else:
+            matches = required if required is not None else set(self.search_index.modified)
+        return matches - excluded
+
+    def search_highlight_terms(self):
+        # Body text the current query asked for; exclusions and title/date filters have nothing to highlight
+        clauses = [clause for clause in self.search_query if clause.field == "text" and not clause.negated]
+        terms = [clause.value for clause in clauses]
+        if self.fuzzy_search_action.isChecked():
+            # What was typed only shows up in exact matches; the words taken for typos of it are highlighted too
+            for clause in clauses:
+                if not clause.exact:
+                    for token in set(WORD_PATTERN.findall(clause.value)):
+                        terms.extend(word for word in self.search_index.words_near(token) if token not in word)
+        return terms
+
+    def filter_notes_by_regex(self, pattern):
+        # Matches come in from the worker processes a chunk at a time; until then the list shows what is known
+        self.search_query = []
+        if not pattern:
+            self.cancel_regex_search()
+            self.regex_pattern = None
             self.filtered_notes = list(range(len(self.notes)))
+            return
+        try:
+            compile_search_pattern(pattern)
+        except re.error as error:
+            self.cancel_regex_search()
+            self.regex_pattern = None
+            self.filtered_notes = []
+            self.show_status(f"Not a valid regular expression: {error}")
+            return
+        if pattern != self.regex_pattern:
+            # The same pattern again, after an edit for instance, keeps its matches showing while it is rescanned
+            self.regex_pattern = pattern
+            self.regex_matches = set()
+        self.filtered_notes = [i for i, note in enumerate(self.notes) if note["id"] in self.regex_matches]
+        # The scan waits for a pause in typing, so a pattern typed a key at a time is only searched for once
+        self.regex_search.cancel()
+        self.regex_start_timer.start()
+
+    def start_regex_search(self):
+        self.regex_found = set()
+        self.index_typed_notes()
+        texts = self.search_index.texts
+        # Notes whose text the search index has not extracted yet go to the workers as title and body
+        self.regex_search.start(
+            self.regex_pattern, {note["id"]: texts.get(note["id"]) or (note["title"], note["content"]) for note in self.notes}
+        )
+
+    def cancel_regex_search(self):
+        self.regex_start_timer.stop()
+        self.regex_search.cancel()
+
+    def on_regex_matched(self, note_ids):
+        self.regex_found.update(note_ids)
+        self.regex_matches.update(note_ids)
+        if note_ids and not self.regex_update_timer.isActive():
+            self.regex_update_timer.start()
+
+    def on_regex_search_finished(self, complete):
+        if complete:
+            self.regex_matches = self.regex_found
+        else:
+            self.show_status(f"The regular expression search took over {self.regex_search.time_budget} seconds and was stopped; "
+                             "only the matches found by then are shown", 10000)
+        self.show_regex_matches()
+
+    def show_regex_matches(self):
+        self.regex_update_timer.stop()
+        current_note = self.notes[self.current_note_index] if self.current_note_index is not None else None
+        self.filtered_notes = [i for i, note in enumerate(self.notes) if note["id"] in self.regex_matches]
+        self.update_notes_table()
+        if current_note is not None:
+            # Keep the open note selected as rows are added around it, without reloading it
+            self.notes_table.blockSignals(True)
+            self.notes_table.clearSelection()
+            if self.current_note_index in self.filtered_notes:
+                self.notes_table.selectRow(self.filtered_notes.index(self.current_note_index))
+            self.notes_table.blockSignals(False)
+
+    def toggle_regex_search(self, checked):
+        self.get_settings().setValue("search/regex", checked)
+        if not checked:
+            # Each worker holds a copy of every note it scans; they are started again by the next regex search
+            self.regex_start_timer.stop()
+            self.regex_search.stop()
+        self.filter_notes(self.search_bar.text())
+        self.update_notes_table()
+
+    def toggle_fuzzy_search(self, checked):
+        self.get_settings().setValue("search/fuzzy", checked)
+        self.filter_notes(self.search_bar.text())
+        self.update_notes_table()
+
+    def index_note(self, note):
+        if self.search_index_saving:
+            self.search_index_deferred[note["id"]] = note
+            return
+        self.search_index.add(note["id"], note["title"], html_to_text(note["content"]), note["modified"].toString("yyyy-MM-dd HH:mm:ss"))
+        self.search_index_changed = True
+        if self.search_index_rebuild is not None:
+            self.search_index_rebuild.add(note["id"])
+
+    def unindex_note(self, note_id):
+        if self.search_index_saving:
+            self.search_index_deferred[note_id] = None
+            return
+        self.search_index.remove(note_id)
+        self.search_index_changed = True
+        if self.search_index_rebuild is not None:
+            self.search_index_rebuild.add(note_id)
+
+    def rebuild_search_index(self, note_ids=None):
+        """Index every note, or just note_ids, from the database in the background.
+
+        The link index is checked along the way. The search index in use keeps answering searches meanwhile;
+        with note_ids, it is patched as each chunk of them comes in.
+        """
+        if self.reindexer is not None:
+            return
+        self.save_large_note()
+        # Notes whose saves have not reached the database yet are indexed again from memory afterwards
+        self.search_index_rebuild = {note["id"] for note in self.notes if note.get("pending_writes")}
+        self.show_status("Building the search index...", 0)
+        self.reindexer = Reindexer(self.db, note_ids, self)
+        self.reindexer.progress.connect(lambda done, total: self.show_status(f"Building the search index... {done} of {total} notes", 0))
+        self.reindexer.indexed.connect(self.on_notes_reindexed)
+        self.reindexer.finished.connect(self.on_search_index_built)
+        self.reindexer.failed.connect(self.on_search_index_failed)
+        self.reindexer.start()
+
+    def on_notes_reindexed(self, entries):
+        if self.reindexer is None:
+            return
+        # Notes changed since the rebuild started were indexed from memory already
+        self.search_index.add_many(entry for entry in entries if entry[0] not in self.search_index_rebuild)
+        self.search_index_changed = True
+
+    def on_search_index_built(self, index, fixed_links):
+        if self.reindexer is None:
+            return  # The window was closed meanwhile
+        self.reindexer = None
+        changed, self.search_index_rebuild = self.search_index_rebuild, None
+        for note_id, links in fixed_links.items():
+            if note_id not in changed:
+                self.set_outbound_links(note_id, links)
+        if index is not None:
+            self.search_index = index
+            # Catch up with the notes saved, deleted or changed elsewhere while it was being built
+            by_id = {note["id"]: note for note in self.notes}
+            for note_id in changed:
+                if note_id in by_id:
+                    self.index_note(by_id[note_id])
+                else:
+                    self.unindex_note(note_id)
+        self.show_status("")
+        self.refresh_notes_list()
+        self.search_index_changed = True
+        self.save_search_index()
+
+    def on_search_index_failed(self, error):
+        if self.reindexer is None:
+            return
+        self.reindexer = None
+        self.search_index_rebuild = None
+        self.show_status(f"Search index could not be built: {error}", 10000)
+
+    def save_search_index(self):
+        """Write the search index next to notes.db, so the next launch does not have to rebuild it.
+
+        It is serialized on the reader pool; notes indexed meanwhile are held back until that is done.
+        """
+        self.index_typed_notes()
+        if not self.search_index_changed or self.search_index_rebuild is not None or self.search_index_saving:
+            return
+        self.search_index_changed = False
+        self.search_index_saving = True
+        # Every note as it was indexed; the next launch indexes again the notes that have another version by then
+        versions = {note["id"]: note["version"] for note in self.notes}
+        index, path = self.search_index, self.get_search_index_path()
+        self.db.submit(lambda: write_file_atomically(path, index.dump(versions)),
+                       callback=self.on_search_index_saved, on_error=self.on_search_index_save_failed)
+
+    def on_search_index_saved(self, result=None):
+        self.search_index_saving = False
+        deferred, self.search_index_deferred = self.search_index_deferred, {}
+        for note_id, note in deferred.items():
+            if note is not None:
+                self.index_note(note)
+            else:
+                self.unindex_note(note_id)
+
+    def on_search_index_save_failed(self, error):
+        self.on_search_index_saved()
+        self.search_index_changed = True
+        self.show_status(f"Search index could not be saved: {error}", 10000)
 
     def update_notes_table(self):
         self.sort_notes()
@@ -299,6 +1823,9 @@ class MainWindow(QMainWindow):
         for row, note_idx in enumerate(self.filtered_notes):
             note = self.notes[note_idx]
             title_item = QTableWidgetItem(note["title"])
+            tags = self.tag_index.tags_of(note["id"])
+            if tags:
+                title_item.setToolTip(" ".join(f"#{tag}" for tag in sorted(tags)))
             date_str = self.format_note_date(note["modified"])
             date_item = QTableWidgetItem(date_str)
             self.notes_table.setItem(row, 0, title_item)
@@ -309,15 +1836,35 @@ class MainWindow(QMainWindow):
         pass
 
     def auto_save_note(self):
+        if self.note_editor is self.plain_editor:
+            # Serializing and indexing a large note is not per-keystroke work; save once typing pauses
+            self.large_note_save_timer.start()
+            return
         if self.current_note_index is not None and not self.note_editor.isReadOnly():
-            content = self.note_editor.toHtml()
             note = self.notes[self.current_note_index]
+            # Notes with formatting the compact format cannot express stay in Qt's own HTML
+            format = "rich" if note["format"] == "rich" else "compact"
+            content = self.note_editor.toHtml() if format == "rich" else document_to_html(self.note_editor.document())
             if note["content"] != content:
                 note["content"] = content
                 note["modified"] = QDateTime.currentDateTime()
-                self.save_note_to_db(note)
+                self.save_note_to_db(note, format, defer_indexing=True)
                 self.update_notes_table()
 
+    def save_large_note(self):
+        """Save edits still pending in the plain text editor; returns whether there were any."""
+        self.large_note_save_timer.stop()
+        editor = self.plain_editor
+        if self.current_note_index is None or self.note_editor is not editor or editor.isReadOnly() or not editor.document().isModified():
+            return False
+        editor.document().setModified(False)
+        note = self.notes[self.current_note_index]
+        # Escaped, so code that reads note bodies as HTML still gets the right text and links out of it
+        note["content"] = html.escape(editor.toPlainText(), quote=False)
+        note["modified"] = QDateTime.currentDateTime()
+        self.save_note_to_db(note, "plain")
+        return True
+
     def keyPressEvent(self, event):
         # If Enter is pressed in search bar and no note is selected
         if self.search_bar.hasFocus() and event.key() in (Qt.Key.Key_Return, Qt.Key.Key_Enter):
@@ -365,6 +1912,7 @@ class MainWindow(QMainWindow):
         super().keyPressEvent(event)
 
     def create_note(self, title):
+        self.save_large_note()
         # Create note with empty content
         note = {"title": title, "content": "", "modified": QDateTime.currentDateTime()}
         self.notes.insert(0, note)
@@ -375,6 +1923,7 @@ class MainWindow(QMainWindow):
         self.notes_table.selectRow(0)
         # Manually set up editor state for new note
         self.current_note_index = self.filtered_notes[0]
+        self.use_editor(self.rich_editor)
         self.note_editor.clear()
         self.note_editor.setPlainText("")
         self.note_editor.setEnabled(True)
@@ -387,6 +1936,7 @@ class MainWindow(QMainWindow):
         if row >= 0 and row < len(self.filtered_notes):
             menu = QMenu(self)
             rename_action = menu.addAction("Rename Note")
+            tags_action = menu.addAction("Edit Tags...")
             delete_action = menu.addAction("Delete Note")
             viewport = self.notes_table.viewport()
             if viewport is not None:
@@ -400,6 +1950,8 @@ class MainWindow(QMainWindow):
                     self.notes_table.editItem(item)
                     # Connect to editing finished
                     self.notes_table.itemChanged.connect(lambda changed_item, r=row, i=idx: self.rename_note(changed_item, r, i))
+                elif action == tags_action:
+                    self.edit_note_tags(self.notes[idx])
                 elif action == delete_action:
                     note = self.notes[idx]
                     reply = QMessageBox.question(self, "Delete Note", f'Delete the note titled "{note['title']}"?', QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
@@ -430,12 +1982,11 @@ class MainWindow(QMainWindow):
             if i != idx and note["title"].strip().lower() == new_title.lower():
                 changed_item.setText(self.notes[idx]["title"])
                 return
-        old_title = self.notes[idx]["title"]
-        self.notes[idx]["title"] = new_title
-        self.save_note_to_db(self.notes[idx])
-        # If title changed, update DB (delete old, save new)
-        if old_title != new_title:
-            self.delete_note_from_db({"title": old_title})
+        note = self.notes[idx]
+        if note["title"] != new_title:
+            rewritten = self.rename_note_in_db(note, new_title)
+            if self.current_note_index is not None and self.notes[self.current_note_index]["id"] in rewritten:
+                self.reload_current_note()
         # Restore edit triggers
         self.notes_table.setEditTriggers(self.notes_table.NoEditTriggers)
         # Disconnect to avoid repeated triggers
@@ -456,59 +2007,724 @@ class MainWindow(QMainWindow):
         os.makedirs(data_dir, exist_ok=True)
         return data_dir
 
-    def get_db_path(self):
-        return os.path.join(self.get_data_dir(), "notes.db")
+    def get_db_path(self):
+        return os.path.join(self.get_data_dir(), "notes.db")
+
+    def get_search_index_path(self):
+        return os.path.join(self.get_data_dir(), "search-index")
+
+    def get_backup_dir(self):
+        return os.path.join(self.get_data_dir(), "Backups")
+
+    def get_settings(self):
+        return QSettings("Notational Celerity", "Notational Celerity")
+
+    def init_db(self):
+        self.db = DatabaseService(self.get_db_path(), parent=self)
+        self.db.failed.connect(self.show_db_error)
+        self.blob_store = BlobStore(self.db, self)
+        self.rich_editor.blob_store = self.blob_store
+        # Notes are loaded once the schema is in place; the window shows up meanwhile
+        self.db.write(create_schema, callback=self.on_schema_ready, on_error=self.on_startup_failed)
+
+    def show_db_error(self, message):
+        QMessageBox.warning(self, "Database Error", f"Your notes could not be saved or read:\n\n{message}")
+
+    def on_startup_failed(self, error):
+        # The window stays disabled until the notes are loaded, so there is nothing to fall back to
+        reply = QMessageBox.critical(
+            self, "Database Error", f"Your notes could not be opened:\n\n{error}",
+            QMessageBox.Retry | QMessageBox.Close, QMessageBox.Retry
+        )
+        if reply == QMessageBox.Retry:
+            self.db.write(create_schema, callback=self.on_schema_ready, on_error=self.on_startup_failed)
+        else:
+            self.close()
+
+    def on_schema_ready(self, data_version):
+        self.data_version = data_version
+        self.load_notes_from_db()
+
+    def load_notes_from_db(self):
+        def read(conn):
+            next_id = conn.execute(
+                "SELECT MAX(COALESCE((SELECT MAX(id) FROM notes), 0), COALESCE((SELECT seq FROM sqlite_sequence WHERE name='notes'), 0)) + 1"
+            ).fetchone()[0]
+            last_seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+            rows = conn.execute("SELECT id, title, content, modified, version, format FROM notes ORDER BY modified DESC").fetchall()
+            links = conn.execute("SELECT source_id, target_title FROM note_links").fetchall()
+            tags = conn.execute("SELECT note_id, tag FROM note_tags ORDER BY note_id").fetchall()
+            return next_id, last_seq, rows, links, tags, SearchIndex.load(index_path)
+        index_path = self.get_search_index_path()
+        self.db.read(read, callback=self.on_notes_loaded, on_error=self.on_startup_failed)
+
+    def on_notes_loaded(self, result):
+        self.next_note_id, self.last_change_seq, rows, links, tags, saved_index = result
+        self.setEnabled(True)
+        self.notes = [self.note_from_row(row) for row in rows]
+        self.outbound_links = {}
+        self.backlinks = {}
+        self.tag_index = TagIndex()
+        for note_id, note_tags in itertools.groupby(tags, key=lambda row: row[0]):
+            self.tag_index.set_tags(note_id, (tag for _, tag in note_tags))
+        for source_id, target_title in links:
+            self.outbound_links.setdefault(source_id, set()).add(target_title)
+            self.backlinks.setdefault(target_title, set()).add(source_id)
+        if saved_index is None:
+            # Searches find nothing until this is done
+            self.search_index = SearchIndex()
+            self.rebuild_search_index()
+        else:
+            index, versions = saved_index
+            by_id = {note["id"]: note for note in self.notes}
+            for note_id in set(index.modified) - by_id.keys():
+                index.remove(note_id)
+                self.search_index_changed = True
+
+            def text_source(note_id):
+                # The saved index has no texts; searches that need one get it from the body loaded here
+                note = by_id.get(note_id)
+                return (note["title"], html_to_text(note["content"])) if note is not None else ("", "")
+            index.text_source = text_source
+            self.search_index = index
+            # Notes saved since the index was, by this or another instance or a session that crashed, or
+            # replaced by a restored backup, have another version now
+            stale = [note for note in self.notes if versions.get(note["id"]) != note["version"]]
+            if len(stale) <= 100:
+                for note in stale:
+                    self.index_note(note)
+            else:
+                self.rebuild_search_index({note["id"] for note in stale})
+        self.filter_notes(self.search_bar.text())
+        self.update_notes_table()
+        # Restore last open note if available
+        settings = self.get_settings()
+        last_title = settings.value("last_open_note_title", "")
+        if last_title:
+            for row, note_idx in enumerate(self.filtered_notes):
+                if self.notes[note_idx]["title"] == last_title:
+                    self.notes_table.selectRow(row)
+                    self.on_note_selected()
+                    break
+        self.start_folder_sync(settings.value("sync/folder", ""))
+        # Poll for changes committed by other windows or processes sharing the database
+        self.change_poll_timer.start(1000)
+        self.backup_timer.start(10 * 60 * 1000)
+        self.back_up_if_due()
+        self.maintenance = IdleMaintenance(self, settings.value("maintenance/idle_seconds", 60, type=int))
+        if self.api_action.isChecked():
+            self.start_api()
+        self.compact_stored_notes([note for note in self.notes if note["format"] == "html"])
+
+    def note_from_row(self, row):
+        # Build an in-memory note from an (id, title, content, modified, version, format) row
+        return {
+            "id": row[0],
+            "title": row[1],
+            "content": row[2],
+            "modified": QDateTime.fromString(row[3], "yyyy-MM-dd HH:mm:ss"),
+            "version": row[4],
+            "format": row[5]
+        }
+
+    def set_outbound_links(self, note_id, links):
+        # Keep the forward and reverse in-memory link maps in step
+        for title in self.outbound_links.pop(note_id, set()) - links:
+            sources = self.backlinks.get(title)
+            if sources is not None:
+                sources.discard(note_id)
+                if not sources:
+                    del self.backlinks[title]
+        if links:
+            self.outbound_links[note_id] = links
+            for title in links:
+                self.backlinks.setdefault(title, set()).add(note_id)
+
+    def queue_note_write(self, notes, fn):
+        # Writes are counted on the notes they touch until they complete, so the change poller can tell
+        # our own queued writes from changes made by other instances
+        for note in notes:
+            note["pending_writes"] = note.get("pending_writes", 0) + 1
+
+        def finished():
+            for note in notes:
+                note["pending_writes"] -= 1
+
+        def done(result):
+            finished()
+            self.on_note_written(notes[0], result)
+
+        def failed(error):
+            finished()
+            if isinstance(error, WriteConflict):
+                # The write was rolled back, so reload every note it touched
+                self.apply_external_changes({note["id"] for note in notes})
+            else:
+                self.show_db_error(str(error))
+        self.db.write(fn, callback=done, on_error=failed)
+
+    def on_note_written(self, note, result):
+        if result is False:
+            # Another instance changed this note first; resolve once its version has been pulled in
+            if self.current_note_index is not None and self.notes[self.current_note_index] is note:
+                self.save_conflict = True
+            self.apply_external_changes()
+        elif isinstance(result, tuple):
+            # The id we picked was taken by another instance in the meantime; the writer assigned a new one
+            self.on_note_id_changed(note, result[1])
+
+    def on_note_id_changed(self, note, old_id):
+        self.unindex_note(old_id)
+        self.index_note(note)
+        links = self.outbound_links.get(old_id, set())
+        self.set_outbound_links(old_id, set())
+        self.set_outbound_links(note["id"], links)
+        tags = self.tag_index.tags_of(old_id)
+        self.tag_index.remove(old_id)
+        self.tag_index.set_tags(note["id"], tags)
+        self.next_note_id = max(self.next_note_id, note["id"] + 1)
+        if self.folder_sync:
+            self.folder_sync.note_id_changed(old_id, note["id"])
+
+    def save_note_to_db(self, note, format="compact", defer_indexing=False):
+        # Insert or update note by row id. New notes get an id here, so the rest of the app never waits for the
+        # database; updates only apply if nobody else changed the row since we last saw it.
+        # Bodies are saved in the compact format, or as escaped plain text ("plain") for large notes.
+        # With defer_indexing, links and the search index catch up once saves pause (see index_typed_notes).
+        title, content = note["title"], note["content"]
+        modified = note["modified"].toString("yyyy-MM-dd HH:mm:ss")
+        insert = note.get("id") is None
+        if insert:
+            note["id"] = self.next_note_id
+            self.next_note_id += 1
+        expected_version = note.get("version", 0)
+        note["version"] = new_version = 0 if insert else random.getrandbits(62)
+        note["format"] = format
+        if defer_indexing and not insert:
+            links = links_changed = None
+            self.notes_to_index[id(note)] = note
+            self.index_timer.start()
+        else:
+            self.notes_to_index.pop(id(note), None)
+            links = extract_note_links(content)
+            links_changed = links != self.outbound_links.get(note["id"], set())
+            self.set_outbound_links(note["id"], links)
+            self.index_note(note)
+        if self.folder_sync:
+            self.folder_sync.note_saved(note)
+
+        def write(conn):
+            # note["id"] is read here rather than captured, in case an earlier insert had to move the note
+            result = True
+            if insert:
+                try:
+                    conn.execute("INSERT INTO notes (id, title, content, modified, version, format) VALUES (?, ?, ?, ?, 0, ?)", (note["id"], title, content, modified, format))
+                except sqlite3.IntegrityError:
+                    old_id = note["id"]
+                    note["id"] = conn.execute("INSERT INTO notes (title, content, modified, version, format) VALUES (?, ?, ?, 0, ?)", (title, content, modified, format)).lastrowid
+                    result = ("moved", old_id)
+            else:
+                updated = conn.execute(
+                    "UPDATE notes SET title=?, content=?, modified=?, version=?, format=? WHERE id=? AND version=?",
+                    (title, content, modified, new_version, format, note["id"], expected_version)
+                )
+                if updated.rowcount == 0:
+                    return False
+            update_note_blobs(conn, note["id"], content)
+            # Only touch the link index when the set of linked titles actually changed
+            if links is not None and (links_changed or result is not True):
+                conn.execute("DELETE FROM note_links WHERE source_id=?", (note["id"],))
+                conn.executemany("INSERT INTO note_links (source_id, target_title) VALUES (?, ?)", [(note["id"], link) for link in links])
+            return result
+        self.queue_note_write([note], write)
+
+    def index_typed_notes(self):
+        """Bring the links and search index entries of notes saved while typing up to date."""
+        self.index_timer.stop()
+        notes, self.notes_to_index = self.notes_to_index, {}
+        for note in notes.values():
+            links = extract_note_links(note["content"])
+            if links != self.outbound_links.get(note["id"], set()):
+                self.set_outbound_links(note["id"], links)
+
+                def write(conn, note=note, links=links):
+                    conn.execute("DELETE FROM note_links WHERE source_id=?", (note["id"],))
+                    conn.executemany("INSERT INTO note_links (source_id, target_title) VALUES (?, ?)", [(note["id"], link) for link in links])
+                    # The body was logged when it was saved; log the note again so other instances fetch its links
+                    conn.execute("INSERT OR REPLACE INTO change_log (note_id) VALUES (?)", (note["id"],))
+                self.db.write(write)
+            self.index_note(note)
+
+    def set_note_tags(self, note, tags):
+        """Replace a note's tags.
+
+        Tags are written under the note's version like an edit, so other instances pick them up and
+        concurrent changes are caught the same way.
+        """
+        tags = frozenset(tags)
+        if tags == self.tag_index.tags_of(note["id"]):
+            return
+        self.tag_index.set_tags(note["id"], tags)
+        expected_version = note["version"]
+        note["version"] = new_version = random.getrandbits(62)
+        # The text is the same, but the saved search index has to record the new version or it goes stale
+        self.search_index_changed = True
+
+        def write(conn):
+            updated = conn.execute("UPDATE notes SET version=? WHERE id=? AND version=?", (new_version, note["id"], expected_version))
+            if updated.rowcount == 0:
+                return False
+            conn.execute("DELETE FROM note_tags WHERE note_id=?", (note["id"],))
+            conn.executemany("INSERT INTO note_tags (note_id, tag) VALUES (?, ?)", [(note["id"], tag) for tag in tags])
+            return True
+        self.queue_note_write([note], write)
+
+    def edit_note_tags(self, note):
+        current = " ".join(sorted(self.tag_index.tags_of(note["id"])))
+        text, ok = QInputDialog.getText(
+            self, "Edit Tags", f'Tags for "{note['title']}", separated by spaces:', QLineEdit.Normal, current
+        )
+        if ok:
+            self.set_note_tags(note, parse_tags(text))
+            self.refresh_notes_list()
+
+    def delete_note_from_db(self, note):
+        self.notes_to_index.pop(id(note), None)
+        self.set_outbound_links(note["id"], set())
+        self.unindex_note(note["id"])
+        self.tag_index.remove(note["id"])
+        if self.folder_sync:
+            self.folder_sync.note_deleted(note)
+
+        def write(conn):
+            conn.execute("DELETE FROM notes WHERE id=?", (note["id"],))
+            conn.execute("DELETE FROM note_links WHERE source_id=?", (note["id"],))
+            conn.execute("DELETE FROM note_tags WHERE note_id=?", (note["id"],))
+            conn.execute("DELETE FROM note_blobs WHERE note_id=?", (note["id"],))
+        self.queue_note_write([note], write)
+
+    def rename_note_in_db(self, note, new_title):
+        """Rename a note and rewrite every inbound link to it in a single transaction.
+
+        The notes that link to the old title come from the link index. The in-memory notes are patched
+        straight away; the database write is all-or-nothing and is rolled back if another instance changed
+        any of those notes first. Returns the ids of the notes whose bodies were rewritten.
+        """
+        self.save_large_note()
+        self.index_typed_notes()
+        old_title = note["title"]
+        sources = set(self.backlinks.get(old_title, ()))
+        updates = []  # (title, content, new version, id, expected version) per touched note
+        rewritten = set()
+        for other in self.notes:
+            if other is not note and other["id"] not in sources:
+                continue
+            expected_version = other["version"]
+            other["version"] = random.getrandbits(62)
+            if other["id"] in sources:
+                other["content"] = rewrite_note_links(other["content"], old_title, new_title)
+                rewritten.add(other["id"])
+            if other is note:
+                other["title"] = new_title
+            updates.append((other, other["title"], other["content"], other["version"], expected_version))
+        for row_id in sources:
+            self.set_outbound_links(row_id, (self.outbound_links.get(row_id, set()) - {old_title}) | {new_title})
+        for other, *_ in updates:
+            self.index_note(other)
+            if self.folder_sync:
+                self.folder_sync.note_saved(other)
+
+        def write(conn):
+            cursor = conn.executemany(
+                "UPDATE notes SET title=?, content=?, version=? WHERE id=? AND version=?",
+                [(title, content, version, other["id"], expected) for other, title, content, version, expected in updates]
+            )
+            if cursor.rowcount != len(updates):
+                raise WriteConflict(f'"{old_title}" or a note linking to it was changed elsewhere')
+            conn.execute("UPDATE OR REPLACE note_links SET target_title=? WHERE target_title=?", (new_title, old_title))
+        self.queue_note_write([other for other, *_ in updates], write)
+        return rewritten
+
+    def choose_sync_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Sync Notes with Folder", self.get_settings().value("sync/folder", ""))
+        if folder:
+            self.start_folder_sync(folder)
+
+    def start_folder_sync(self, folder):
+        if not folder or not os.path.isdir(folder):
+            return
+        settings = self.get_settings()
+        if self.folder_sync:
+            self.folder_sync.stop()
+        same_folder = settings.value("sync/folder", "") == folder
+        if not same_folder:
+            # The cached file state belongs to the previous folder
+            self.db.write(lambda conn: conn.execute("DELETE FROM sync_files"))
+            settings.setValue("sync/folder", folder)
+        self.folder_sync = FolderSync(self, folder, load_state=same_folder)
+        self.stop_sync_action.setEnabled(True)
+
+    def stop_folder_sync(self):
+        if self.folder_sync:
+            self.folder_sync.stop()
+            self.folder_sync = None
+        self.get_settings().remove("sync/folder")
+        self.db.write(lambda conn: conn.execute("DELETE FROM sync_files"))
+        self.stop_sync_action.setEnabled(False)
+
+    def import_synced_note(self, note_id, title, text):
+        """Create or update a note from the text of a synced file and return it."""
+        if len(text) >= self.large_note_chars:
+            content, format = html.escape(text, quote=False), "plain"
+        else:
+            content, format = plain_text_to_html(text), "compact"
+        note = next((n for n in self.notes if n["id"] == note_id), None) if note_id is not None else None
+        if note is None:
+            note = {"title": title, "content": content, "modified": QDateTime.currentDateTime()}
+            self.save_note_to_db(note, format)
+            self.notes.insert(0, note)
+            if self.current_note_index is not None:
+                self.current_note_index += 1
+        else:
+            note["content"] = content
+            note["modified"] = QDateTime.currentDateTime()
+            self.save_note_to_db(note, format)
+            if self.current_note_index is not None and self.notes[self.current_note_index] is note:
+                self.reload_current_note()
+        return note
+
+    def append_to_note(self, note, text):
+        """Add text to the end of a note as new lines."""
+        is_current = self.current_note_index is not None and self.notes[self.current_note_index] is note
+        if is_current:
+            self.save_large_note()
+        if note["format"] == "plain":
+            escaped = html.escape(text, quote=False)
+            content, format = f"{note['content']}\n{escaped}" if note["content"] else escaped, "plain"
+        else:
+            content = note["content"] if note["format"] == "compact" else self.compact_html(note["content"], lossless=True)
+            if content is None:
+                # Keep formatting the compact format would drop: add the lines through a document instead
+                doc = QTextDocument()
+                doc.setDefaultFont(self.rich_editor.document().defaultFont())
+                doc.setHtml(note["content"])
+                cursor = QTextCursor(doc)
+                cursor.movePosition(QTextCursor.End)
+                cursor.insertBlock()
+                cursor.insertText(text)
+                content, format = doc.toHtml(), "rich"
+            else:
+                addition = plain_text_to_html(text)
+                if content and addition:
+                    # Both are complete compact bodies; splice the new paragraphs in before the end of the old one
+                    content = content[:-len("</body>")] + addition[len(COMPACT_HTML_HEADER):]
+                else:
+                    content = content or addition
+                format = "compact"
+        note["content"] = content
+        note["modified"] = QDateTime.currentDateTime()
+        self.save_note_to_db(note, format)
+        if is_current:
+            self.reload_current_note()
+
+    def compact_database(self):
+        # A full VACUUM, which also converts databases from before incremental vacuum; saves wait until it is done
+        def compact(conn):
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+
+        def done(result):
+            self.get_settings().remove("maintenance/convert_attempts")
+            self.show_status("Database compacted")
+        self.show_status("Compacting the database...", 0)
+        self.db.write(compact, callback=done)
+
+    def toggle_api(self, checked):
+        self.get_settings().setValue("api/enabled", checked)
+        if checked:
+            self.start_api()
+        elif self.api:
+            self.api.stop()
+            self.api = None
+            self.show_status("Scripting access turned off")
+
+    def start_api(self):
+        if self.api:
+            return
+        port = self.get_settings().value("api/port", 7331, type=int)
+        try:
+            self.api = NoteApi(self, port, self.get_api_token())
+        except OSError as error:
+            self.show_status(f"Scripting access could not start on port {port}: {error}", 10000)
+            return
+        self.show_status(f"Scripting access on http://127.0.0.1:{port}/api")
+
+    def get_api_token(self):
+        # Scripts prove they may use the API by sending the contents of this file, which only this user can read
+        path = os.path.join(self.get_data_dir(), "api-token")
+        try:
+            with open(path) as f:
+                token = f.read().strip()
+            if token:
+                return token
+        except OSError:
+            pass
+        token = secrets.token_urlsafe(32)
+        with os.fdopen(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as f:
+            f.write(token)
+        return token
 
-    def get_settings(self):
-        return QSettings("Notational Celerity", "Notational Celerity")
+    def compact_html(self, content, lossless=False):
+        # Re-encode any rich text, such as Qt's own toHtml output, in the compact storage format. With lossless,
+        # return None instead if reading the result back would not give the same document.
+        doc = QTextDocument()
+        doc.setDefaultFont(self.rich_editor.document().defaultFont())
+        doc.setHtml(content)
+        compact = document_to_html(doc)
+        if lossless:
+            check = QTextDocument()
+            check.setDefaultFont(doc.defaultFont())
+            check.setHtml(compact)
+            # Qt writes an empty style attribute on list items of documents it read, which means nothing
+            if check.toHtml().replace('style="" ', "") != doc.toHtml().replace('style="" ', ""):
+                return None
+        return compact
 
-    def init_db(self):
-        self.conn = sqlite3.connect(self.get_db_path())
-        self.conn.execute("""
-            CREATE TABLE IF NOT EXISTS notes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                content TEXT NOT NULL,
-                modified TEXT NOT NULL
-            )
-        """)
-        self.conn.commit()
+    def compact_stored_notes(self, notes):
+        """Convert notes stored in an older format to the compact one, a few at a time between GUI events.
 
-    def load_notes_from_db(self):
-        self.notes = []
-        for row in self.conn.execute("SELECT title, content, modified FROM notes ORDER BY modified DESC"):
-            self.notes.append({
-                "title": row[0],
-                "content": row[1],
-                "modified": QDateTime.fromString(row[2], "yyyy-MM-dd HH:mm:ss")
-            })
+        Only notes the compact format reproduces exactly are converted. The others, with colours, fonts,
+        alignment or tables say, are marked "rich" and keep their body.
+        """
+        batch, notes = notes[:20], notes[20:]
+        updates = []
+        for note in batch:
+            expected_version = note["version"]
+            compact = self.compact_html(note["content"], lossless=True)
+            if compact is not None:
+                note["content"], note["format"] = compact, "compact"
+            else:
+                note["format"] = "rich"
+            note["version"] = random.getrandbits(62)
+            updates.append((note["content"], note["format"], note["version"], note["id"], expected_version))
+        if updates:
+            # Same text under new versions, which the saved search index has to record
+            self.search_index_changed = True
+            # A note changed elsewhere meanwhile keeps its row; the change poller then reloads it
+            self.queue_note_write(batch, lambda conn: conn.executemany(
+                "UPDATE notes SET content=?, format=?, version=? WHERE id=? AND version=?", updates
+            ))
+        if notes:
+            QTimer.singleShot(0, lambda: self.compact_stored_notes(notes))
+
+    def remove_note(self, note):
+        # Delete a note from the database and memory, closing it first if it is open
+        current_note = self.notes[self.current_note_index] if self.current_note_index is not None else None
+        if current_note is note:
+            self.exit_note()
+            current_note = None
+        self.delete_note_from_db(note)
+        self.notes.remove(note)
+        self.current_note_index = self.notes.index(current_note) if current_note is not None else None
+
+    def refresh_notes_list(self):
         self.filter_notes(self.search_bar.text())
         self.update_notes_table()
-        # Restore last open note if available
+
+    def check_for_external_changes(self):
+        # PRAGMA data_version on the writer connection only changes when another connection commits,
+        # so idle polling is nearly free
+        if self.external_check_pending:
+            return
+        self.external_check_pending = True
+        self.db.write(lambda conn: conn.execute("PRAGMA data_version").fetchone()[0], callback=self.on_data_version)
+
+    def on_data_version(self, data_version):
+        self.external_check_pending = False
+        if data_version != self.data_version:
+            self.data_version = data_version
+            self.apply_external_changes()
+
+    def apply_external_changes(self, note_ids=()):
+        """Pull notes changed by other instances since the last seen change_log entry into memory.
+
+        note_ids are reloaded as well, whether or not the change log mentions them.
+        """
+        # Edits the plain text editor has not saved yet must be queued first, so they count as ours
+        self.save_large_note()
+        self.stale_note_ids.update(note_ids)
+        if self.external_fetch_pending:
+            # Fetch again when the one in flight is back, it may predate the change we are asked about
+            self.external_fetch_again = True
+            return
+        self.external_fetch_pending = True
+        last_seq = self.last_change_seq
+        stale_ids, self.stale_note_ids = self.stale_note_ids, set()
+        if self.current_note_index is not None:
+            stale_ids.add(self.notes[self.current_note_index]["id"])
+
+        def read(conn):
+            # Runs on the writer connection so it sees every write we queued before it
+            rows = conn.execute("SELECT seq, note_id FROM change_log WHERE seq > ? ORDER BY seq", (last_seq,)).fetchall()
+            changed_ids = list({note_id for _, note_id in rows} | stale_ids)
+            fresh = {}
+            links = {}
+            tags = {}
+            for start in range(0, len(changed_ids), 500):
+                chunk = changed_ids[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                for row in conn.execute(f"SELECT id, title, content, modified, version, format FROM notes WHERE id IN ({placeholders})", chunk):
+                    fresh[row[0]] = row
+                for source_id, target_title in conn.execute(f"SELECT source_id, target_title FROM note_links WHERE source_id IN ({placeholders})", chunk):
+                    links.setdefault(source_id, set()).add(target_title)
+                for note_id, tag in conn.execute(f"SELECT note_id, tag FROM note_tags WHERE note_id IN ({placeholders})", chunk):
+                    tags.setdefault(note_id, set()).add(tag)
+            return (rows[-1][0] if rows else last_seq), changed_ids, fresh, links, tags
+        self.db.write(read, callback=self.on_external_changes)
+
+    def on_external_changes(self, result):
+        self.external_fetch_pending = False
+        self.last_change_seq, changed_ids, fresh, links, tags = result
+        changed = False
+        current_changed = None
+        current_note = self.notes[self.current_note_index] if self.current_note_index is not None else None
+        by_id = {note["id"]: note for note in self.notes}
+        for note_id in changed_ids:
+            note = by_id.get(note_id)
+            row = fresh.get(note_id)
+            if note is not None and note.get("pending_writes"):
+                # Our own writes queued after this read will either land or report a conflict
+                continue
+            if row is None:
+                if note is not None:
+                    # Deleted elsewhere
+                    self.notes.remove(note)
+                    self.notes_to_index.pop(id(note), None)
+                    self.set_outbound_links(note_id, set())
+                    self.unindex_note(note_id)
+                    self.tag_index.remove(note_id)
+                    changed = True
+                    if note is current_note:
+                        current_note = None
+            elif note is None:
+                note = self.note_from_row(row)
+                self.notes.append(note)
+                self.set_outbound_links(note_id, links.get(note_id, set()))
+                self.index_note(note)
+                self.tag_index.set_tags(note_id, tags.get(note_id, ()))
+                self.next_note_id = max(self.next_note_id, note_id + 1)
+                changed = True
+            elif row[4] != note["version"]:
+                # Tags are not part of the open note's text, so they are taken as they are even from a conflicting version
+                self.tag_index.set_tags(note_id, tags.get(note_id, ()))
+                if note is current_note:
+                    current_changed = self.note_from_row(row)
+                else:
+                    note.update(self.note_from_row(row))
+                    self.set_outbound_links(note_id, links.get(note_id, set()))
+                    self.index_note(note)
+                    changed = True
+            elif links.get(note_id, set()) != self.outbound_links.get(note_id, set()):
+                # Links are written after the body once its author stops typing, without a new version
+                self.set_outbound_links(note_id, links.get(note_id, set()))
+
+        if current_note is None and self.current_note_index is not None:
+            self.exit_note()
+        if changed:
+            self.current_note_index = self.notes.index(current_note) if current_note is not None else None
+            self.filter_notes(self.search_bar.text())
+            self.update_notes_table()
+        if current_changed is not None:
+            self.resolve_current_note_change(current_note, current_changed, links.get(current_note["id"], set()))
+        self.save_conflict = False
+        if self.external_fetch_again:
+            self.external_fetch_again = False
+            self.apply_external_changes()
+
+    def resolve_current_note_change(self, note, remote, remote_links):
+        # The open note was changed by another instance; only ask when we also have edits it would overwrite
+        if self.save_conflict:
+            reply = QMessageBox.question(
+                self, "Note Changed Elsewhere",
+                f'The note "{note['title']}" was changed in another window. Keep your version?\n\n'
+                "Choose No to discard your edits and load the other version.",
+                QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes
+            )
+            if reply == QMessageBox.Yes:
+                # Adopt the remote version so our save now wins
+                note["version"] = remote["version"]
+                note["modified"] = QDateTime.currentDateTime()
+                self.save_note_to_db(note, note["format"])
+                self.update_notes_table()
+                return
+        note.update(remote)
+        self.set_outbound_links(note["id"], remote_links)
+        self.index_note(note)
+        self.update_notes_table()
+        self.reload_current_note()
+
+    def show_status(self, message, timeout=5000):
+        self.statusBar().showMessage(message, timeout)
+
+    def toggle_auto_backup(self, checked):
+        self.get_settings().setValue("backup/enabled", checked)
+        self.back_up_if_due()
+
+    def back_up_if_due(self):
+        # Scheduled backups: one per interval (a day unless configured), while automatic backups are on
+        if not self.auto_backup_action.isChecked():
+            return
         settings = self.get_settings()
-        last_title = settings.value("last_open_note_title", "")
-        if last_title:
-            for row, note_idx in enumerate(self.filtered_notes):
-                if self.notes[note_idx]["title"] == last_title:
-                    self.notes_table.selectRow(row)
-                    self.on_note_selected()
-                    break
+        interval = timedelta(hours=settings.value("backup/interval_hours", 24, type=float))
+        last = settings.value("backup/last", "")
+        if last and datetime.now() - datetime.fromisoformat(last) < interval:
+            return
+        self.back_up_notes()
 
-    def save_note_to_db(self, note):
-        # Insert or update note by title (for simplicity, titles are unique)
-        c = self.conn.cursor()
-        c.execute("SELECT id FROM notes WHERE title=?", (note["title"],))
-        row = c.fetchone()
-        if row:
-            c.execute("UPDATE notes SET content=?, modified=? WHERE id=?", (note["content"], note["modified"].toString("yyyy-MM-dd HH:mm:ss"), row[0]))
-        else:
-            c.execute("INSERT INTO notes (title, content, modified) VALUES (?, ?, ?)", (note["title"], note["content"], note["modified"].toString("yyyy-MM-dd HH:mm:ss")))
-        self.conn.commit()
+    def back_up_notes(self):
+        """Take a consistent copy of notes.db while the app keeps running, then verify and rotate it off the GUI thread."""
+        if self.backup_running:
+            return
+        self.backup_running = True
+        backup_dir = self.get_backup_dir()
+        os.makedirs(backup_dir, exist_ok=True)
+        name = datetime.now().strftime("notes-%Y%m%d-%H%M%S.db")
+        keep = self.get_settings().value("backup/keep", 7, type=int)
+        path = os.path.join(backup_dir, name)
 
-    def delete_note_from_db(self, note):
-        c = self.conn.cursor()
-        c.execute("DELETE FROM notes WHERE title=?", (note["title"],))
-        self.conn.commit()
+        def copied(partial_path):
+            self.db.submit(finish_backup, partial_path, path, keep, callback=self.on_backup_finished, on_error=self.on_backup_failed)
+        self.db.backup(os.path.join(backup_dir, f".{name}.partial"), callback=copied, on_error=self.on_backup_failed)
+
+    def on_backup_finished(self, path):
+        self.backup_running = False
+        self.get_settings().setValue("backup/last", datetime.now().isoformat(timespec="seconds"))
+        self.show_status(f"Notes backed up to {path}")
+
+    def on_backup_failed(self, error):
+        self.backup_running = False
+        self.show_status(f"Backup failed: {error}", 10000)
+
+    def closeEvent(self, event):
+        # Let queued writes reach the disk before the process exits
+        self.save_large_note()
+        self.index_typed_notes()
+        if self.folder_sync:
+            self.folder_sync.stop()
+            self.folder_sync = None
+        if self.maintenance:
+            self.maintenance.cancelled.set()
+        self.save_search_index()
+        if self.reindexer:
+            self.reindexer.stop()
+            self.reindexer = None
+        if self.api:
+            self.api.stop()
+            self.api = None
+        self.regex_start_timer.stop()
+        self.regex_search.stop()
+        self.db.close()
+        super().closeEvent(event)
 
     def save_notes_table_column_sizes(self, logicalIndex, oldSize, newSize):
         if logicalIndex in (0, 1):
@@ -648,22 +2864,24 @@ class MainWindow(QMainWindow):
         # Convert [[title]] to clickable links, keeping brackets visible and clickable
         def link_replacer(match):
             title = match.group(1)
-            if self.is_web_url(title):
-                return f'<a href="{title}">{title}</a>'
-            else:
-                # Only create links for existing notes
-                note_exists = any(note["title"] == title for note in self.notes)
-                if note_exists:
-                    # Don't create links to the current note (avoid self-referencing)
-                    if self.current_note_index is not None and self.notes[self.current_note_index]["title"] == title:
-                        return f'[[{title}]]'  # Keep as plain text for current note
-                    else:
-                        return f'<a href="note:{title}">{title}</a>'
-                else:
-                    # Keep non-existent note titles as plain text
-                    return f'[[{title}]]'
+            href = self.wiki_link_href(title)
+            return f'<a href="{href}">{title}</a>' if href else f'[[{title}]]'
         return re.sub(r'\[\[([^\]]+)\]\]', link_replacer, html)
 
+    def wiki_link_href(self, title):
+        # Where [[title]] links to, or None if it stays plain text
+        if self.is_web_url(title):
+            return title
+        # Only create links for existing notes
+        note_exists = any(note["title"] == title for note in self.notes)
+        if note_exists:
+            # Don't create links to the current note (avoid self-referencing)
+            if self.current_note_index is not None and self.notes[self.current_note_index]["title"] == title:
+                return None  # Keep as plain text for current note
+            return f"note:{title}"
+        # Keep non-existent note titles as plain text
+        return None
+
     def is_web_url(self, text):
         # Must contain at least one dot to be considered a URL
         if '.' not in text:
@@ -690,10 +2908,23 @@ class MainWindow(QMainWindow):
 <li>Press Enter to create a new note with that title</li>
 <li>Notes are automatically saved as you type</li>
 <li>Tip: You can also find words inside of your notes</li>
+<li>Enable Search &gt; Fuzzy Matching to also find words you mistyped</li>
+</ul>
+
+<p><strong>Search Syntax:</strong></p>
+<ul>
+<li>meeting budget: notes containing both words, anywhere</li>
+<li>"exact phrase": words in exactly this order</li>
+<li>-draft: leave out notes containing draft</li>
+<li>title:budget: only look at note titles</li>
+<li>modified:&gt;2026-01-01: notes changed after a date (also &lt;, &gt;=, &lt;= or an exact day)</li>
+<li>tag:work: notes tagged work; tag:work,home for either tag, -tag:done to leave a tag out</li>
+<li>Search &gt; Regular Expressions: treat the search text as a regular expression instead</li>
 </ul>
 
 <p><strong>Navigation:</strong></p>
 <ul>
+<li>Search terms are highlighted in the opened note; F3 and Shift+F3 jump between them</li>
 <li>Click on any note in the list to open it</li>
 <li>Use the back arrow (←) in the search bar to exit a note</li>
 <li>Click the brush icon to clear the search</li>
@@ -745,6 +2976,7 @@ class MainWindow(QMainWindow):
 <p><strong>Right-click on a note in the list for:</strong></p>
 <ul>
 <li>Rename Note: Double-click the title or use context menu</li>
+<li>Edit Tags: Space-separated tags to find the note by with tag:name</li>
 <li>Delete Note: Confirmation dialog will appear</li>
 </ul>
 
@@ -758,6 +2990,7 @@ class MainWindow(QMainWindow):
 
 <ul>
 <li>Notes are automatically saved to your system's app data directory</li>
+<li>A backup copy is made once a day in the Backups folder there; File &gt; Back Up Now makes one right away</li>
 <li>The app remembers your column widths and sort preferences</li>
 <li>All formatting is preserved when you save notes</li>
 <li>Links are only clickable for existing notes and valid URLs</li>
@@ -772,6 +3005,8 @@ class MainWindow(QMainWindow):
 <li><strong>Linux:</strong> ~/.local/share/Notational Celerity/</li>
 </ul>"""
 
+        help_content = self.compact_html(help_content)
+
         # Check if help note already exists
         help_note_index = None
         for i, note in enumerate(self.notes):
@@ -883,11 +3118,1114 @@ class MainWindow(QMainWindow):
         cursor.insertText(new_text)
         cursor.clearSelection()
 
-class NoteEdit(QTextEdit):
-    def __init__(self, parent=None, link_handler=None):
+class FolderSync(QObject):
+    """Mirror the notes to a folder of plain-text files, in both directions.
+
+    Files are matched to notes by id through the sync_files table, which also caches the mtime, size
+    and content hash of every file as of the last sync, so a rescan only reads files whose stat changed
+    and only imports files whose content actually changed. Listing, reading and writing the folder runs
+    on the reader pool, one job at a time, and only the results are applied on the GUI thread.
+    """
+    EXTENSIONS = (".txt", ".md")
+
+    def __init__(self, window, folder, load_state=True):
+        super().__init__(window)
+        self.window = window
+        self.db = window.db
+        self.folder = folder
+        self.files = {}  # File name -> [note id, mtime_ns, size, hash]
+        self.note_files = {}  # Note id -> file name
+        self.pending_exports = {}  # Note id -> note waiting to be written out
+        self.skipped_files = {}  # File name -> (mtime_ns, size) of files whose title clashes with another synced note
+        self.importing = False
+        self.confirming = False  # Whether the user is being asked about missing files
+        self.job = None  # Number of the folder job running on the reader pool
+        self.job_number = 0
+        self.job_kind = None  # "scan" or "export"
+        self.job_future = None
+        self.scanned_files = None  # Names synced when the running scan started
+        self.rescan_pending = False  # Whether to rescan once the running job is done
+        self.watcher = QFileSystemWatcher([folder], self)
+        self.watcher.directoryChanged.connect(self.schedule_rescan)
+        self.rescan_timer = QTimer(self)
+        self.rescan_timer.setSingleShot(True)
+        self.rescan_timer.setInterval(300)
+        self.rescan_timer.timeout.connect(self.rescan)
+        # Directory watches do not report in-place edits on every platform; a stat-only rescan is cheap
+        self.periodic_timer = QTimer(self)
+        self.periodic_timer.timeout.connect(self.rescan)
+        self.periodic_timer.start(30000)
+        self.export_timer = QTimer(self)
+        self.export_timer.setSingleShot(True)
+        self.export_timer.setInterval(1000)
+        self.export_timer.timeout.connect(self.flush_exports)
+        if load_state:
+            self.db.read(lambda conn: conn.execute("SELECT note_id, filename, mtime_ns, size, hash FROM sync_files").fetchall(), callback=self.on_state_loaded)
+        else:
+            self.rescan()
+
+    def on_state_loaded(self, rows):
+        for note_id, filename, mtime_ns, size, digest in rows:
+            self.files[filename] = [note_id, mtime_ns, size, digest]
+            self.note_files[note_id] = filename
+        self.rescan()
+
+    def stop(self):
+        self.flush_exports(wait=True)
+        self.rescan_timer.stop()
+        self.periodic_timer.stop()
+        self.watcher.removePaths(self.watcher.directories())
+        self.deleteLater()
+
+    def schedule_rescan(self, path=None):
+        self.rescan_timer.start()
+
+    def file_name_for(self, title, note_id, extension, reserved=()):
+        name = re.sub(r'[\\/:*?"<>|\x00-\x1f]', "-", title).strip().rstrip(". ")[:200] or "Untitled"
+        candidate = f"{name}{extension}"
+        # Names differing only in case are the same file on macOS and Windows
+        taken = {filename.lower() for filename, entry in self.files.items() if entry[0] != note_id}
+        taken.update(filename.lower() for filename in reserved)
+        counter = 2
+        while candidate.lower() in taken:
+            candidate = f"{name} ({counter}){extension}"
+            counter += 1
+        return candidate
+
+    def note_saved(self, note):
+        # Writes are batched; typing in a note should not rewrite its file on every keystroke
+        if self.importing:
+            return
+        self.pending_exports[note["id"]] = note
+        self.export_timer.start()
+
+    def note_deleted(self, note):
+        self.finish_job()
+        self.pending_exports.pop(note["id"], None)
+        filename = self.note_files.pop(note["id"], None)
+        if filename is None:
+            return
+        self.files.pop(filename, None)
+        note_id = note["id"]
+        self.db.write(lambda conn: conn.execute("DELETE FROM sync_files WHERE note_id=?", (note_id,)))
+        if not self.importing:
+            try:
+                os.remove(os.path.join(self.folder, filename))
+            except OSError:
+                pass
+
+    def flush_exports(self, wait=False):
+        """Write the notes saved since the last flush out to the folder; with wait, before returning."""
+        self.export_timer.stop()
+        if wait:
+            self.finish_job()
+        elif self.job is not None:
+            # Flushed once the running job is done
+            return
+        if not self.pending_exports:
+            return
+        exports, self.pending_exports = self.pending_exports, {}
+        plans = []
+        reserved = set()
+        for note_id, note in exports.items():
+            old_name = self.note_files.get(note_id)
+            filename = self.file_name_for(note["title"], note_id, os.path.splitext(old_name)[1] if old_name else ".txt", reserved)
+            reserved.add(filename)
+            plans.append((note_id, old_name, filename, note["content"]))
+        if wait:
+            self.apply_exports(write_sync_files(self.folder, plans))
+        else:
+            self.run_job("export", write_sync_files, self.folder, plans)
+
+    def apply_exports(self, written):
+        rows = []
+        for note_id, old_name, filename, mtime_ns, size, digest in written:
+            if old_name:
+                self.files.pop(old_name, None)
+            self.files[filename] = [note_id, mtime_ns, size, digest]
+            self.note_files[note_id] = filename
+            rows.append((note_id, filename, mtime_ns, size, digest))
+        if rows:
+            self.save_state(rows)
+
+    def run_job(self, kind, fn, *args):
+        # Jobs run one at a time, so each starts from the sync state the one before it left behind
+        self.job_number += 1
+        number = self.job = self.job_number
+        self.job_kind = kind
+        self.job_future = self.db.submit(
+            fn, *args, callback=lambda result: self.on_job_done(number, result), on_error=lambda error: self.on_job_done(number, None)
+        )
+
+    def on_job_done(self, number, result):
+        if number != self.job:
+            # Already finished by finish_job
+            return
+        self.job = None
+        if result is not None:
+            if self.job_kind == "export":
+                self.apply_exports(result)
+            else:
+                self.apply_rescan(result)
+        if self.rescan_pending:
+            self.rescan()
+        elif self.pending_exports:
+            self.flush_exports()
+
+    def finish_job(self):
+        # Called before the sync state changes under the running job. An export is waited for and applied
+        # now; a scan is dropped and run again later, since what it found may no longer apply.
+        if self.job is None:
+            return
+        self.job = None
+        if self.job_kind == "scan":
+            self.rescan_pending = True
+            self.rescan_timer.start()
+            return
+        try:
+            written = self.job_future.result()
+        except Exception:
+            return
+        self.apply_exports(written)
+
+    def save_state(self, rows):
+        self.db.write(lambda conn: conn.executemany(
+            "INSERT OR REPLACE INTO sync_files (note_id, filename, mtime_ns, size, hash) VALUES (?, ?, ?, ?, ?)", rows
+        ))
+
+    def note_id_changed(self, old_id, new_id):
+        self.finish_job()
+        if old_id in self.pending_exports:
+            self.pending_exports[new_id] = self.pending_exports.pop(old_id)
+        filename = self.note_files.pop(old_id, None)
+        if filename is not None:
+            self.note_files[new_id] = filename
+            self.files[filename][0] = new_id
+            self.db.write(lambda conn: conn.execute("UPDATE sync_files SET note_id=? WHERE note_id=?", (new_id, old_id)))
+
+    def rescan(self):
+        """Import new and changed files, and delete notes whose files were removed."""
+        if self.confirming:
+            return
+        self.rescan_pending = True
+        if self.job is not None:
+            return
+        if self.pending_exports:
+            # Written out first, so the scan finds them in place
+            self.flush_exports()
+            return
+        self.rescan_pending = False
+        self.scanned_files = set(self.files)
+        files = {name: tuple(entry[1:]) for name, entry in self.files.items()}
+        self.run_job("scan", scan_sync_folder, self.folder, files, dict(self.skipped_files), self.EXTENSIONS)
+
+    def apply_rescan(self, result):
+        if result is None or self.confirming:
+            return
+        seen, changed_files, missing = result
+        updated_rows = []
+        changed = False
+        notes_by_id = {note["id"]: note for note in self.window.notes}
+        notes_by_title = {note["title"].lower(): note for note in self.window.notes}
+        self.importing = True
+        try:
+            for name, mtime_ns, size, digest, data in changed_files:
+                cached = self.files.get(name)
+                if cached is None and name in self.scanned_files:
+                    # Its note was deleted during the scan
+                    continue
+                if data is None:
+                    # Touched but not changed
+                    cached[1], cached[2] = mtime_ns, size
+                    updated_rows.append((cached[0], name, *cached[1:]))
+                    continue
+                note_id = cached[0] if cached else None
+                if note_id is None:
+                    # A new file; adopt an unsynced note of the same title unless that note is newer than the file
+                    existing = notes_by_title.get(os.path.splitext(name)[0].lower())
+                    if existing is not None and existing["id"] not in self.note_files:
+                        if existing["modified"].toMSecsSinceEpoch() * 1000000 > mtime_ns:
+                            self.pending_exports[existing["id"]] = existing
+                            continue
+                        note_id = existing["id"]
+                    elif existing is not None:
+                        self.skipped_files[name] = (mtime_ns, size)
+                        continue
+                note = self.window.import_synced_note(note_id, os.path.splitext(name)[0], data.decode("utf-8", errors="replace"))
+                self.files[name] = [note["id"], mtime_ns, size, digest]
+                self.note_files[note["id"]] = name
+                updated_rows.append((note["id"], name, mtime_ns, size, digest))
+                changed = True
+            missing = [name for name in missing if name in self.files]
+            if missing and not self.confirm_deletions(missing, bool(seen)):
+                # Write the notes out again instead
+                for name in missing:
+                    note_id = self.files.pop(name)[0]
+                    self.note_files.pop(note_id, None)
+                    self.db.write(lambda conn, note_id=note_id: conn.execute("DELETE FROM sync_files WHERE note_id=?", (note_id,)))
+                missing = []
+            for name in missing:
+                note = notes_by_id.get(self.files[name][0])
+                if note is not None:
+                    self.window.remove_note(note)
+                    changed = True
+                else:
+                    self.note_deleted({"id": self.files[name][0]})
+        finally:
+            self.importing = False
+        if updated_rows:
+            self.save_state(updated_rows)
+        # Notes that have never been written out yet; flushed once this job is done
+        for note in self.window.notes:
+            if note["id"] not in self.note_files:
+                self.pending_exports[note["id"]] = note
+        if changed:
+            self.window.refresh_notes_list()
+
+    def confirm_deletions(self, missing, folder_has_files):
+        # Deleting one file deletes its note; more than that, or an emptied folder, which may just be an
+        # unmounted drive or a sync client starting over, has to be confirmed first
+        if len(missing) == 1 and folder_has_files:
+            return True
+        self.confirming = True
+        try:
+            reply = QMessageBox.question(
+                self.window, "Synced Files Missing",
+                f"{len(missing)} files are missing from {self.folder}. Delete their notes too?\n\n"
+                "Choose No to keep the notes and write their files again.",
+                QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+            )
+        finally:
+            self.confirming = False
+        return reply == QMessageBox.Yes
+
+RegexWorker = namedtuple("RegexWorker", ["index", "process", "commands"])
+
+class RegexSearch(QObject):
+    """Regular expression search over the plain text of every note, in worker processes.
+
+    re holds the GIL for the whole of a match, so a pattern that backtracks without end would stall any
+    thread it ran on, and the GUI with it. The text is scanned instead by spawned worker processes, one per
+    core up to MAX_WORKERS, each keeping a shard of the notes between searches, so a search only sends them
+    its pattern and the notes changed since the last one. Matches are reported a chunk at a time, a worker
+    drops a scan once a newer search reaches it, and one still scanning when the time budget runs out is
+    killed and started again with its shard. The workers are started by the first search and stopped
+    again after IDLE_SECONDS without one.
+    """
+    CHUNK_CHARS = 256 * 1024
+    MAX_WORKERS = 4
+    IDLE_SECONDS = 120
+    matched = pyqtSignal(object)  # Ids of the matching notes in one chunk of the current search
+    finished = pyqtSignal(bool)  # Whether every chunk was scanned, rather than the time budget running out
+    chunk_done = pyqtSignal(object, int, object, object)  # Worker, search number, ids, state; emitted on its reader thread
+    worker_exited = pyqtSignal(object)  # Emitted on the worker's reader thread
+
+    def __init__(self, parent=None, time_budget=5):
+        super().__init__(parent)
+        self.time_budget = time_budget  # Seconds
+        self.workers = []  # RegexWorker per shard; a note belongs to shard id % len(workers)
+        self.texts = {}  # {note id: text or (title, body)} as the workers have it
+        self.search_number = 0
+        self.busy = {}  # Worker index -> number of the search it is still scanning
+        self.chunk_done.connect(self.on_chunk_done)
+        self.worker_exited.connect(self.on_worker_exited)
+        self.budget_timer = QTimer(self)
+        self.budget_timer.setSingleShot(True)
+        self.budget_timer.timeout.connect(self.on_budget_exceeded)
+        self.idle_timer = QTimer(self)
+        self.idle_timer.setSingleShot(True)
+        self.idle_timer.setInterval(self.IDLE_SECONDS * 1000)
+        self.idle_timer.timeout.connect(self.on_idle)
+
+    def start(self, pattern, texts):
+        """Scan texts, a new {note id: text or (title, body)} dict, for pattern, replacing any search still running."""
+        self.search_number += 1
+        if not self.workers:
+            if not texts:
+                self.finished.emit(True)
+                return
+            self.workers = [self.spawn_worker(index) for index in range(min(os.cpu_count() or 1, self.MAX_WORKERS))]
+        changed = [{} for _ in self.workers]
+        removed = [[] for _ in self.workers]
+        for note_id, text in texts.items():
+            if self.texts.get(note_id) != text:
+                changed[note_id % len(self.workers)][note_id] = text
+        for note_id in self.texts.keys() - texts.keys():
+            removed[note_id % len(self.workers)].append(note_id)
+        self.texts = texts
+        for worker in self.workers:
+            if changed[worker.index] or removed[worker.index]:
+                worker.commands.put(("update", changed[worker.index], removed[worker.index]))
+            worker.commands.put(("scan", self.search_number, pattern))
+            self.busy[worker.index] = self.search_number
+        self.budget_timer.start(self.time_budget * 1000)
+        self.idle_timer.start()
+
+    def searching(self):
+        return self.search_number in self.busy.values()
+
+    def cancel(self):
+        # Workers drop the scan at their next chunk; one stuck in a match is killed when the budget runs out
+        self.search_number += 1
+        for index in self.busy:
+            self.workers[index].commands.put(("cancel",))
+        if not self.busy:
+            self.budget_timer.stop()
+        elif not self.budget_timer.isActive():
+            self.budget_timer.start(self.time_budget * 1000)
+
+    def stop(self):
+        """Stop the workers; the next search starts them again and sends them every note."""
+        self.budget_timer.stop()
+        self.idle_timer.stop()
+        for worker in self.workers:
+            self.kill_worker(worker)
+        self.workers = []
+        self.texts = {}
+        self.busy = {}
+
+    def spawn_worker(self, index, texts=None):
+        context = spawn_context()
+        commands = context.Queue()
+        results, sender = context.Pipe(duplex=False)
+        process = context.Process(
+            target=regex_worker, args=(commands, sender, self.CHUNK_CHARS), name=f"regex-search-{index}", daemon=True
+        )
+        process.start()
+        # Only the worker may hold the sending end, so reading fails once it is gone
+        sender.close()
+        worker = RegexWorker(index, process, commands)
+        threading.Thread(target=self.read_results, args=(worker, results), name=f"regex-results-{index}", daemon=True).start()
+        if texts:
+            commands.put(("update", texts, []))
+        return worker
+
+    def kill_worker(self, worker):
+        worker.process.kill()
+        worker.process.join()
+        # Whatever is still queued for it is dropped rather than waited on
+        worker.commands.cancel_join_thread()
+        worker.commands.close()
+
+    def restart_worker(self, index):
+        # Workers cannot be interrupted half-way through a match, only killed; the new one gets the shard again
+        self.kill_worker(self.workers[index])
+        shard = {note_id: text for note_id, text in self.texts.items() if note_id % len(self.workers) == index}
+        self.workers[index] = self.spawn_worker(index, shard)
+        self.busy.pop(index, None)
+
+    def read_results(self, worker, results):
+        # Runs on a thread of its own for each worker, until the worker exits
+        try:
+            while True:
+                self.chunk_done.emit(worker, *results.recv())
+        except (EOFError, OSError):
+            self.worker_exited.emit(worker)
+        finally:
+            results.close()
+
+    def on_chunk_done(self, worker, number, ids, state):
+        if worker not in self.workers:
+            return
+        if state is not None and self.busy.get(worker.index) == number:
+            del self.busy[worker.index]
+        if number != self.search_number:
+            return
+        self.matched.emit(ids)
+        if state is not None and not self.searching():
+            self.budget_timer.stop()
+            self.finished.emit(True)
+
+    def on_worker_exited(self, worker):
+        if worker not in self.workers:
+            return
+        # The worker died on its own; its shard counts as scanned, matching nothing
+        searching = self.searching()
+        self.restart_worker(worker.index)
+        if searching and not self.searching():
+            self.budget_timer.stop()
+            self.finished.emit(True)
+
+    def on_idle(self):
+        if self.busy:
+            self.idle_timer.start()
+        else:
+            self.stop()
+
+    def on_budget_exceeded(self):
+        searching = self.searching()
+        for index in list(self.busy):
+            self.restart_worker(index)
+        if searching:
+            self.finished.emit(False)
+
+class Reindexer(QObject):
+    """Rebuilds what is derived from note bodies: the search index, and the link index as a check.
+
+    Rows are streamed out of notes.db a chunk at a time on a background thread and parsed in a pool of
+    worker processes, one per core, so parsing is not held to a single core by the GIL. Workers send back
+    each note's text and words, and the search index is built from all of them once every chunk is in, or
+    when only some notes are reindexed, handed to the window a chunk at a time to patch the index in use.
+    Link sets that disagree with note_links are written back in one transaction per chunk.
+    """
+    CHUNK_SIZE = 200
+    progress = pyqtSignal(int, int)  # Notes done, notes in total
+    indexed = pyqtSignal(object)  # With note_ids, the add_many entries of each chunk, for the search index in use
+    finished = pyqtSignal(object, object)  # New search index or None with note_ids, {note id: links} for each link set that was fixed
+    failed = pyqtSignal(str)
+
+    def __init__(self, db, note_ids=None, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.note_ids = note_ids  # Only reindex these
+        self.index = SearchIndex() if note_ids is None else None
+        self.cancelled = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="notes-reindex", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.cancelled.set()
+        self.thread.join()
+
+    def run(self):
+        conn = sqlite3.connect(Path(self.db.path).as_uri() + "?mode=ro", uri=True, timeout=DatabaseService.BUSY_TIMEOUT)
+        try:
+            result = self.reindex(conn)
+        except Exception as error:
+            self.failed.emit(str(error))
+        else:
+            if result is not None:
+                self.finished.emit(*result)
+        finally:
+            conn.close()
+
+    def reindex(self, conn):
+        if self.note_ids is not None:
+            total = len(self.note_ids)
+        else:
+            total = conn.execute("SELECT COUNT(*) FROM notes").fetchone()[0]
+        fixed_links = {}
+        entries = []  # (id, title, searchable text, words, modified) per note, added to the index in one go at the end
+        done = 0
+        chunks = self.chunks(conn)
+        workers = min(os.cpu_count() or 1, -(-total // self.CHUNK_SIZE))
+        if workers <= 1:
+            # A single chunk or a single core: worker processes would only add their start-up time
+            for rows in chunks:
+                if self.cancelled.is_set():
+                    return None
+                done += self.collect(conn, rows, index_chunk(rows), entries, fixed_links)
+                self.progress.emit(done, total)
+            return self.build(entries), fixed_links
+        with ProcessPoolExecutor(max_workers=workers, mp_context=spawn_context()) as pool:
+            pending = {}
+            for rows in chunks:
+                if self.cancelled.is_set():
+                    pool.shutdown(cancel_futures=True)
+                    return None
+                pending[pool.submit(index_chunk, rows)] = rows
+                # Keep every worker busy without reading the whole database ahead of them
+                if len(pending) >= 2 * workers:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        done += self.collect(conn, pending.pop(future), future.result(), entries, fixed_links)
+                    self.progress.emit(done, total)
+            for future in as_completed(pending):
+                done += self.collect(conn, pending[future], future.result(), entries, fixed_links)
+                self.progress.emit(done, total)
+        return self.build(entries), fixed_links
+
+    def build(self, entries):
+        if self.index is not None:
+            self.index.add_many(entries)
+        return self.index
+
+    def chunks(self, conn):
+        # (id, title, content, modified, version) rows, CHUNK_SIZE at a time, with no read transaction held between chunks
+        query = "SELECT id, title, content, modified, version FROM notes"
+        if self.note_ids is not None:
+            note_ids = sorted(self.note_ids)
+            for start in range(0, len(note_ids), self.CHUNK_SIZE):
+                chunk = note_ids[start:start + self.CHUNK_SIZE]
+                yield conn.execute(f"{query} WHERE id IN ({','.join('?' * len(chunk))})", chunk).fetchall()
+            return
+        last_id = 0
+        while True:
+            rows = conn.execute(f"{query} WHERE id > ? ORDER BY id LIMIT ?", (last_id, self.CHUNK_SIZE)).fetchall()
+            if not rows:
+                return
+            yield rows
+            last_id = rows[-1][0]
+
+    def collect(self, conn, rows, result, entries, fixed_links):
+        # Gather one chunk's results; returns the number of notes it covered
+        links = {}
+        chunk_entries = []
+        for (note_id, title, _, modified, _), (_, searchable, words, note_links) in zip(rows, result):
+            chunk_entries.append((note_id, title, searchable, words.split(), modified))
+            links[note_id] = note_links
+        if self.index is None:
+            self.indexed.emit(chunk_entries)
+        else:
+            entries.extend(chunk_entries)
+        chunk_ids = [row[0] for row in rows]
+        stored = {}
+        for source_id, target_title in conn.execute(
+            f"SELECT source_id, target_title FROM note_links WHERE source_id IN ({','.join('?' * len(chunk_ids))})", chunk_ids
+        ):
+            stored.setdefault(source_id, set()).add(target_title)
+        fixes = [(row[0], row[4], links[row[0]]) for row in rows if links[row[0]] != stored.get(row[0], set())]
+        if fixes:
+            fixed_links.update((note_id, note_links) for note_id, _, note_links in fixes)
+            self.db.write(self.write_links, fixes)
+        return len(rows)
+
+    @staticmethod
+    def write_links(conn, fixes):
+        # Skips notes saved since they were read; their save wrote their links
+        for note_id, version, links in fixes:
+            if conn.execute("SELECT 1 FROM notes WHERE id=? AND version=?", (note_id, version)).fetchone():
+                conn.execute("DELETE FROM note_links WHERE source_id=?", (note_id,))
+                conn.executemany("INSERT INTO note_links (source_id, target_title) VALUES (?, ?)", [(note_id, link) for link in links])
+
+class IdleMaintenance(QObject):
+    """Tidy up the database once the user has stopped typing for a while.
+
+    Each idle period runs a chain of short jobs on the database writer thread: free pages left by deleted
+    and rewritten notes go back to the file system by incremental vacuum, a slice at a time; PRAGMA optimize
+    refreshes the statistics the query planner uses to pick indexes; and the write-ahead log is checkpointed
+    and truncated. Saves queued meanwhile run between two jobs, and typing aborts the job in flight at once.
+    The search index is written to disk first if it has changed.
+    """
+    VACUUM_PAGES_PER_SLICE = 256
+    # Converting a database to incremental vacuum takes one full VACUUM. Idle periods only try it on databases
+    # small enough to finish quickly, and give up after a few interrupted attempts; File > Compact Database
+    # does it regardless.
+    CONVERT_MAX_BYTES = 64 * 1024 * 1024
+    CONVERT_MAX_ATTEMPTS = 3
+
+    def __init__(self, window, idle_seconds=60):
+        super().__init__(window)
+        self.window = window
+        self.db = window.db
+        self.cancelled = threading.Event()
+        self.running = False
+        self.converting = False
+        self.conversion_reported = False
+        self.size_before = 0
+        self.idle_timer = QTimer(self)
+        self.idle_timer.setSingleShot(True)
+        self.idle_timer.setInterval(idle_seconds * 1000)
+        self.idle_timer.timeout.connect(self.start)
+        window.rich_editor.textChanged.connect(self.user_active)
+        window.plain_editor.textChanged.connect(self.user_active)
+        window.search_bar.textChanged.connect(self.user_active)
+        self.idle_timer.start()
+
+    def user_active(self):
+        self.cancelled.set()
+        self.idle_timer.start()
+
+    def start(self):
+        if self.running:
+            return
+        self.window.save_search_index()
+        self.running = True
+        self.cancelled.clear()
+        self.run_slice(self.database_size, self.on_measured)
+
+    def run_slice(self, fn, callback):
+        if self.cancelled.is_set():
+            self.running = False
+            return
+        self.db.write(self.interruptible, fn, callback=callback, on_error=self.on_failed)
+
+    def interruptible(self, conn, fn):
+        # Runs on the writer thread. The progress handler aborts the statement in flight as soon as the user is
+        # back, and locks held by other instances are skipped rather than waited out.
+        conn.set_progress_handler(self.cancelled.is_set, 1000)
+        conn.execute("PRAGMA busy_timeout = 0")
+        try:
+            return fn(conn)
+        finally:
+            conn.set_progress_handler(None, 0)
+            conn.execute(f"PRAGMA busy_timeout = {DatabaseService.BUSY_TIMEOUT * 1000}")
+
+    def database_size(self, conn):
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        wal_path = self.db.path + "-wal"
+        return page_size * page_count + (os.path.getsize(wal_path) if os.path.exists(wal_path) else 0)
+
+    def on_measured(self, size):
+        self.size_before = size
+        self.run_slice(self.delete_unused_blobs, self.on_blobs_deleted)
+
+    def delete_unused_blobs(self, conn):
+        # Images no note refers to any more. Recently added ones are kept, as an undo in the editor may
+        # bring their reference back.
+        conn.execute("""
+            DELETE FROM blobs WHERE added < datetime('now', '-1 day')
+            AND NOT EXISTS (SELECT 1 FROM note_blobs WHERE note_blobs.hash = blobs.hash)
+        """)
+
+    def on_blobs_deleted(self, result):
+        self.run_slice(lambda conn: conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2, self.on_vacuum_mode)
+
+    def on_vacuum_mode(self, incremental):
+        if incremental:
+            self.run_slice(lambda conn: conn.execute("PRAGMA freelist_count").fetchone()[0], self.on_vacuumed)
+            return
+        # Databases created before incremental vacuum was switched on need one full VACUUM to convert
+        settings = self.window.get_settings()
+        attempts = settings.value("maintenance/convert_attempts", 0, type=int)
+        if attempts < self.CONVERT_MAX_ATTEMPTS and self.size_before <= self.CONVERT_MAX_BYTES:
+            settings.setValue("maintenance/convert_attempts", attempts + 1)
+            self.converting = True
+            self.run_slice(self.enable_incremental_vacuum, self.on_converted)
+        else:
+            # Incremental vacuum does nothing until then; skip to the other jobs
+            self.report_unconverted()
+            self.run_slice(self.optimize, self.on_optimized)
+
+    def enable_incremental_vacuum(self, conn):
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+
+    def on_converted(self, result):
+        self.converting = False
+        self.window.get_settings().remove("maintenance/convert_attempts")
+        self.run_slice(self.optimize, self.on_optimized)
+
+    def vacuum(self, conn):
+        conn.execute(f"PRAGMA incremental_vacuum({self.VACUUM_PAGES_PER_SLICE})").fetchall()
+        return conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+    def on_vacuumed(self, free_pages):
+        if free_pages:
+            self.run_slice(self.vacuum, self.on_vacuumed)
+        else:
+            self.run_slice(self.optimize, self.on_optimized)
+
+    def optimize(self, conn):
+        # Sample rather than read whole tables, so this stays quick on large databases
+        conn.execute("PRAGMA analysis_limit = 400")
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name='sqlite_stat1'").fetchone() is None:
+            # PRAGMA optimize only keeps existing statistics up to date; gather them the first time
+            conn.execute("ANALYZE")
+        conn.execute("PRAGMA optimize")
+
+    def on_optimized(self, result):
+        self.run_slice(self.checkpoint, self.on_checkpointed)
+
+    def checkpoint(self, conn):
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+        return self.database_size(conn)
+
+    def on_checkpointed(self, size):
+        self.running = False
+        reclaimed = self.size_before - size
+        if reclaimed >= 1024 * 1024:
+            self.window.show_status(f"Database maintenance freed {reclaimed / (1024 * 1024):.1f} MB")
+        elif reclaimed > 0:
+            self.window.show_status(f"Database maintenance freed {reclaimed / 1024:.0f} KB")
+
+    def on_failed(self, error):
+        # Interrupted by the user, or another instance held a lock; the next idle period tries again
+        self.running = False
+        if self.converting:
+            self.converting = False
+            if self.window.get_settings().value("maintenance/convert_attempts", 0, type=int) >= self.CONVERT_MAX_ATTEMPTS:
+                self.report_unconverted()
+
+    def report_unconverted(self):
+        # Once per session
+        if not self.conversion_reported:
+            self.conversion_reported = True
+            self.window.show_status("Automatic database cleanup is not set up yet; use File > Compact Database to finish it", 15000)
+
+class BlobStore(QObject):
+    """Content-addressed store for images pasted or dropped into notes.
+
+    Each distinct image is stored once in the blobs table, keyed by the SHA-256 of its encoded bytes, and
+    note bodies refer to it by a blob:<hash> image name. Decoded images are kept in an LRU cache; others are
+    read and decoded on the reader pool the first time a note shows them.
+    """
+    SCHEME = "blob"
+    CACHE_BYTES = 64 * 1024 * 1024
+
+    def __init__(self, db, parent=None):
         super().__init__(parent)
+        self.db = db
+        self.cache = OrderedDict()  # Hash -> decoded QImage, least recently used first
+        self.cache_bytes = 0
+        self.loading = {}  # Hash -> callbacks waiting for the image
+
+    def add(self, data, image):
+        """Store encoded image data and return the image name a note uses to refer to it."""
+        key = hashlib.sha256(data).hexdigest()
+        self.remember(key, image)
+        self.db.write(lambda conn: conn.execute(
+            "INSERT INTO blobs (hash, data, added) VALUES (?, ?, datetime('now')) ON CONFLICT (hash) DO UPDATE SET added=excluded.added",
+            (key, data)
+        ))
+        return f"{self.SCHEME}:{key}"
+
+    def image(self, name, callback):
+        """Return the decoded image for a blob: name, or None and call callback(image) once it has been loaded."""
+        key = name.partition(":")[2]
+        image = self.cache.get(key)
+        if image is not None:
+            self.cache.move_to_end(key)
+            return image
+        if key in self.loading:
+            if callback is not None:
+                self.loading[key].append(callback)
+        else:
+            self.loading[key] = [callback] if callback is not None else []
+            self.db.read(self.load, key, callback=lambda image: self.on_loaded(key, image), on_error=lambda error: self.loading.pop(key, None))
+        return None
+
+    @staticmethod
+    def load(conn, key):
+        # Runs on the reader pool, so decoding stays off the GUI thread as well
+        row = conn.execute("SELECT data FROM blobs WHERE hash=?", (key,)).fetchone()
+        return QImage.fromData(row[0]) if row else QImage()
+
+    def on_loaded(self, key, image):
+        callbacks = self.loading.pop(key, [])
+        if image.isNull():
+            return
+        self.remember(key, image)
+        for callback in callbacks:
+            callback(image)
+
+    def remember(self, key, image):
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return
+        self.cache[key] = image
+        self.cache_bytes += image.sizeInBytes()
+        while self.cache_bytes > self.CACHE_BYTES and len(self.cache) > 1:
+            _, evicted = self.cache.popitem(last=False)
+            self.cache_bytes -= evicted.sizeInBytes()
+
+class ApiError(Exception):
+    """A scripting API request that cannot be carried out; the message goes back to the client."""
+
+class ApiRequestHandler(BaseHTTPRequestHandler):
+    # One thread per connection, which stays open between requests
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out as separate writes; don't let the second wait for the client's delayed ACK
+    disable_nagle_algorithm = True
+    MAX_BODY = 64 * 1024 * 1024
+
+    def setup(self):
+        super().setup()
+        self.server.api.track_connection(self.connection, True)
+
+    def finish(self):
+        self.server.api.track_connection(self.connection, False)
+        super().finish()
+
+    def do_POST(self):
+        if self.path != "/api":
+            self.reply(404, {"error": "not found"})
+            return
+        if not secrets.compare_digest(self.headers.get("Authorization", ""), f"Bearer {self.server.api.token}"):
+            self.reply(401, {"error": "missing or wrong token"})
+            return
+        if self.headers.get("Content-Length") is None:
+            self.reply(411, {"error": "Content-Length is required"})
+            return
+        try:
+            length = int(self.headers["Content-Length"])
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.reply(400, {"error": "invalid Content-Length"})
+            return
+        if length > self.MAX_BODY:
+            self.reply(413, {"error": "request too large"})
+            return
+        try:
+            payload = json.loads(self.rfile.read(length))
+        except ValueError as error:
+            self.reply(400, {"error": f"invalid JSON: {error}"})
+            return
+        requests = payload if isinstance(payload, list) else [payload]
+        try:
+            responses = self.server.api.run(requests)
+        except TimeoutError:
+            self.reply(503, {"error": "the app is busy"})
+            return
+        except ApiError as error:
+            self.reply(503, {"error": str(error)})
+            return
+        self.reply(200, responses if isinstance(payload, list) else responses[0])
+
+    def reply(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if status != 200:
+            # The request body may not have been read, so the connection cannot be reused
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+class NoteApi(QObject):
+    """Loopback-only HTTP/JSON endpoint for scripts, served while the app runs.
+
+    Scripts POST one request object, or a list of them as a batch, to /api with the token from the
+    api-token file as a bearer token. Each request names an op: search, get, create or append. Connections
+    are kept alive and each runs on its own thread, but the requests themselves run on the GUI thread,
+    one batch at a time, against the in-memory notes and search index, and saves go through the
+    database writer like edits made in the window.
+    """
+    requested = pyqtSignal(object, object)  # Requests, Future for their responses
+    TIMEOUT = 30  # Seconds a connection waits for the GUI thread
+
+    def __init__(self, window, port, token):
+        super().__init__(window)
+        self.window = window
+        self.token = token
+        self.requested.connect(self.on_requested)
+        self.stopped = False
+        self.connections = set()  # Sockets of the open connections, so stop can close them
+        self.connections_lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), ApiRequestHandler)
+        self.server.daemon_threads = True
+        self.server.api = self
+        self.thread = threading.Thread(target=self.server.serve_forever, name="notes-api", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop listening and shut down the connections still open; requests that come in meanwhile get an error."""
+        self.stopped = True
+        self.server.shutdown()
+        self.server.server_close()
+        with self.connections_lock:
+            for connection in self.connections:
+                try:
+                    connection.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+    def track_connection(self, connection, is_open):
+        # Called on the connection threads as they start and end
+        with self.connections_lock:
+            if is_open:
+                self.connections.add(connection)
+            else:
+                self.connections.discard(connection)
+
+    def run(self, requests):
+        # Called on a connection thread; hands the batch to the GUI thread and waits for the responses
+        if self.stopped:
+            raise ApiError("the scripting API has been stopped")
+        future = Future()
+        self.requested.emit(requests, future)
+        return future.result(timeout=self.TIMEOUT)
+
+    def on_requested(self, requests, future):
+        if self.stopped:
+            future.set_exception(ApiError("the scripting API has been stopped"))
+            return
+        responses = []
+        changed = False
+        try:
+            for request in requests:
+                try:
+                    if not isinstance(request, dict):
+                        raise ApiError("each request must be a JSON object")
+                    op = request.get("op")
+                    handler = getattr(self, f"op_{op}", None) if isinstance(op, str) else None
+                    if handler is None:
+                        raise ApiError(f"unknown op: {op!r}")
+                    result = handler(request)
+                    changed = changed or op in ("create", "append")
+                    responses.append({"ok": True, "result": result})
+                except ApiError as error:
+                    responses.append({"ok": False, "error": str(error)})
+                except Exception as error:
+                    # A bug rather than a bad request; report it instead of leaving the client waiting
+                    responses.append({"ok": False, "error": f"internal error: {error!r}"})
+            if changed:
+                self.window.refresh_notes_list()
+        finally:
+            # The connection thread waits on this, so it is resolved whatever happens
+            future.set_result(responses)
+
+    def describe(self, note):
+        return {"id": note["id"], "title": note["title"], "modified": note["modified"].toString("yyyy-MM-dd HH:mm:ss")}
+
+    def find_note(self, request):
+        # By id, or by title: exactly if possible, otherwise ignoring case like the search bar does
+        if "id" in request:
+            note = next((note for note in self.window.notes if note["id"] == request["id"]), None)
+        elif isinstance(request.get("title"), str):
+            title = request["title"].strip()
+            note = next((note for note in self.window.notes if note["title"] == title), None)
+            if note is None:
+                note = next((note for note in self.window.notes if note["title"].strip().lower() == title.lower()), None)
+        else:
+            raise ApiError("id or title is required")
+        if note is None:
+            raise ApiError("no such note")
+        return note
+
+    def text_argument(self, request, name):
+        value = request.get(name)
+        if not isinstance(value, str):
+            raise ApiError(f"{name} must be a string")
+        return value
+
+    def op_search(self, request):
+        # Same query syntax and index as the search bar; most recently modified first
+        query = parse_search_query(self.text_argument(request, "query"))
+        window = self.window
+        if query:
+            ids = window.query_notes(query, fuzzy=bool(request.get("fuzzy", False)))
+            notes = [note for note in window.notes if note["id"] in ids]
+        else:
+            notes = list(window.notes)
+        notes.sort(key=lambda note: note["modified"], reverse=True)
+        limit = request.get("limit", 100)
+        return [self.describe(note) for note in (notes[:limit] if isinstance(limit, int) and limit >= 0 else notes)]
+
+    def op_get(self, request):
+        note = self.find_note(request)
+        return dict(self.describe(note), text=html_to_text(note["content"]), tags=sorted(self.window.tag_index.tags_of(note["id"])))
+
+    def op_create(self, request):
+        title = self.text_argument(request, "title").strip()
+        if not title:
+            raise ApiError("title must not be empty")
+        if any(note["title"].strip().lower() == title.lower() for note in self.window.notes):
+            raise ApiError("a note with this title already exists")
+        text = self.text_argument(request, "text") if "text" in request else ""
+        note = self.window.import_synced_note(None, title, text)
+        return self.describe(note)
+
+    def op_append(self, request):
+        note = self.find_note(request)
+        self.window.append_to_note(note, self.text_argument(request, "text"))
+        return self.describe(note)
+
+class SearchMatchData(QTextBlockUserData):
+    # Search match spans cached on a text block, valid while the block revision and search terms are unchanged
+    def __init__(self, revision, generation, spans):
+        super().__init__()
+        self.revision = revision
+        self.generation = generation
+        self.spans = spans
+
+class NoteEditorMixin:
+    """Search match highlighting, Tab/Shift+Tab indentation and the empty placeholder, for both note editors."""
+    # Blocks above and below the viewport that get highlighted ahead of scrolling
+    HIGHLIGHT_MARGIN_BLOCKS = 20
+
+    def setup_note_editor(self, link_handler):
         self.link_handler = link_handler
         self.placeholder_text = "No Note Selected"
+        self.search_pattern = None
+        self.search_expression = None
+        self.search_generation = 0
+        self.match_format = QTextCharFormat()
+        self.match_format.setBackground(QColor(255, 230, 0, 160))
+        # Matches are recomputed for the visible blocks only, at most once per event loop pass
+        self.highlight_timer = QTimer(self)
+        self.highlight_timer.setSingleShot(True)
+        self.highlight_timer.timeout.connect(self.update_search_highlights)
+        self.textChanged.connect(self.schedule_search_highlights)
+        self.verticalScrollBar().valueChanged.connect(self.schedule_search_highlights)
+
+    def schedule_search_highlights(self, *args):
+        if self.search_pattern is not None:
+            self.highlight_timer.start(0)
+
+    def set_search_terms(self, terms):
+        """Highlight terms (case-insensitively) wherever they appear in the visible part of the note."""
+        terms = sorted({term for term in terms if term}, key=len, reverse=True)
+        self.search_generation += 1
+        if terms:
+            self.search_pattern = re.compile("|".join(re.escape(term) for term in terms), re.IGNORECASE)
+            self.search_expression = QRegularExpression(
+                "|".join(QRegularExpression.escape(term) for term in terms),
+                QRegularExpression.CaseInsensitiveOption
+            )
+        else:
+            self.search_pattern = None
+            self.search_expression = None
+        self.update_search_highlights()
+
+    def visible_blocks(self):
+        viewport = self.viewport()
+        first = self.cursorForPosition(QPoint(0, 0)).block()
+        last = self.cursorForPosition(QPoint(viewport.width(), viewport.height())).block()
+        for _ in range(self.HIGHLIGHT_MARGIN_BLOCKS):
+            if not first.previous().isValid():
+                break
+            first = first.previous()
+        block = first
+        remaining_margin = self.HIGHLIGHT_MARGIN_BLOCKS
+        while block.isValid():
+            yield block
+            if block.blockNumber() >= last.blockNumber():
+                if remaining_margin == 0:
+                    break
+                remaining_margin -= 1
+            block = block.next()
+
+    def update_search_highlights(self):
+        if self.search_pattern is None:
+            if self.extraSelections():
+                self.setExtraSelections([])
+            return
+        selections = []
+        for block in self.visible_blocks():
+            data = block.userData()
+            if not isinstance(data, SearchMatchData) or data.revision != block.revision() or data.generation != self.search_generation:
+                spans = [match.span() for match in self.search_pattern.finditer(block.text())]
+                data = SearchMatchData(block.revision(), self.search_generation, spans)
+                block.setUserData(data)
+            for start, end in data.spans:
+                cursor = QTextCursor(block)
+                cursor.setPosition(block.position() + start)
+                cursor.setPosition(block.position() + end, QTextCursor.KeepAnchor)
+                selection = QTextEdit.ExtraSelection()
+                selection.cursor = cursor
+                selection.format = self.match_format
+                selections.append(selection)
+        self.setExtraSelections(selections)
+
+    def find_search_match(self, backward=False):
+        """Select the next (or previous) search match after the cursor, wrapping around the note."""
+        if self.search_expression is None:
+            return
+        document = self.document()
+        flags = QTextDocument.FindBackward if backward else QTextDocument.FindFlags()
+        found = document.find(self.search_expression, self.textCursor(), flags)
+        if found.isNull():
+            wrap = QTextCursor(document)
+            if backward:
+                wrap.movePosition(QTextCursor.End)
+            found = document.find(self.search_expression, wrap, flags)
+        if not found.isNull():
+            self.setTextCursor(found)
+            self.ensureCursorVisible()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.schedule_search_highlights()
 
     def keyPressEvent(self, event):
         if event.key() == Qt.Key.Key_Tab:
@@ -960,6 +4298,101 @@ class NoteEdit(QTextEdit):
             painter.drawText(rect, Qt.AlignmentFlag.AlignCenter, self.placeholder_text)
             painter.restore()
 
+# Images inlined in pasted HTML, as browsers and office suites put them on the clipboard
+DATA_IMAGE_PATTERN = re.compile(r'(<img\b[^>]*?\bsrc\s*=\s*["\'])data:image/[\w.+-]+;base64,([^"\']*)(["\'])', re.IGNORECASE)
+
+class NoteEdit(NoteEditorMixin, QTextEdit):
+    def __init__(self, parent=None, link_handler=None):
+        super().__init__(parent)
+        self.setup_note_editor(link_handler)
+        self.blob_store = None  # Set by the window once the database is open
+        self.pending_images = set()
+        self.relayout_timer = QTimer(self)
+        self.relayout_timer.setSingleShot(True)
+        self.relayout_timer.timeout.connect(self.relayout_images)
+
+    def canInsertFromMimeData(self, source):
+        return source.hasImage() or super().canInsertFromMimeData(source)
+
+    def insertFromMimeData(self, source):
+        # Images go to the blob store, so the note body only gets a short reference to each
+        images = self.images_from_mime_data(source) if self.blob_store is not None else []
+        if not images:
+            if self.blob_store is not None and source.hasHtml() and "data:" in source.html():
+                # Pasted HTML can carry its images inline as data: URLs; store those too
+                copy = QMimeData()
+                copy.setHtml(DATA_IMAGE_PATTERN.sub(self.store_data_image, source.html()))
+                if source.hasText():
+                    copy.setText(source.text())
+                source = copy
+            super().insertFromMimeData(source)
+            return
+        cursor = self.textCursor()
+        for data, image in images:
+            fmt = QTextImageFormat()
+            fmt.setName(self.blob_store.add(data, image))
+            cursor.insertImage(fmt)
+        self.setTextCursor(cursor)
+
+    def store_data_image(self, match):
+        # Replace the data: URL of an <img> with the name of the same image in the blob store
+        try:
+            data = base64.b64decode(re.sub(r"\s+", "", match.group(2)), validate=True)
+        except binascii.Error:
+            return match.group(0)
+        image = QImage.fromData(data)
+        if image.isNull():
+            return match.group(0)
+        return match.group(1) + self.blob_store.add(data, image) + match.group(3)
+
+    def images_from_mime_data(self, source):
+        # (encoded bytes, decoded image) for each image in a paste or drop, keeping the original encoding if there is one
+        images = []
+        for url in source.urls() if source.hasUrls() else []:
+            if url.isLocalFile():
+                try:
+                    with open(url.toLocalFile(), "rb") as f:
+                        data = f.read()
+                except OSError:
+                    continue
+                image = QImage.fromData(data)
+                if not image.isNull():
+                    images.append((data, image))
+        if images or not source.hasImage():
+            return images
+        for mime_type in ("image/png", "image/jpeg", "image/gif"):
+            if source.hasFormat(mime_type):
+                data = bytes(source.data(mime_type))
+                image = QImage.fromData(data)
+                if not image.isNull():
+                    return [(data, image)]
+        image = QImage(source.imageData())
+        buffer = QBuffer()
+        buffer.open(QBuffer.WriteOnly)
+        image.save(buffer, "PNG")
+        return [(bytes(buffer.data()), image)]
+
+    def loadResource(self, type, name):
+        if type == QTextDocument.ImageResource and name.scheme() == BlobStore.SCHEME and self.blob_store is not None:
+            key = name.toString()
+            # Layout asks for the same image many times while it is still loading
+            callback = None if key in self.pending_images else self.on_image_loaded
+            image = self.blob_store.image(key, callback)
+            if image is not None:
+                return image
+            self.pending_images.add(key)
+            return QVariant()
+        return super().loadResource(type, name)
+
+    def on_image_loaded(self, image):
+        # Relayout outside the loader's callback loop; loadResource then finds the image in the cache
+        self.relayout_timer.start(0)
+
+    def relayout_images(self):
+        self.pending_images.clear()
+        document = self.document()
+        document.markContentsDirty(0, document.characterCount() - 1)
+
     def mouseReleaseEvent(self, event):
         cursor = self.cursorForPosition(event.pos())
         anchor = cursor.charFormat().anchorHref()
@@ -969,7 +4402,33 @@ class NoteEdit(QTextEdit):
             return  # Do not call super to prevent placing cursor in link
         super().mouseReleaseEvent(event)
 
+class PlainNoteEdit(NoteEditorMixin, QPlainTextEdit):
+    """Editor for notes too large to edit as rich text.
+
+    QPlainTextEdit lays out only what changes and what is on screen, so typing costs the same however
+    long the note is. Links are not rendered; clicking inside [[...]] follows it instead.
+    """
+    def __init__(self, parent=None, link_handler=None, link_resolver=None):
+        super().__init__(parent)
+        self.setup_note_editor(link_handler)
+        self.link_resolver = link_resolver  # [[title]] -> href, or None when it does not link anywhere
+
+    def mouseReleaseEvent(self, event):
+        if self.link_handler and self.link_resolver and not self.textCursor().hasSelection():
+            cursor = self.cursorForPosition(event.pos())
+            column = cursor.positionInBlock()
+            for match in WIKI_LINK_PATTERN.finditer(cursor.block().text()):
+                if match.start() < column < match.end():
+                    href = self.link_resolver(match.group(1))
+                    if href:
+                        self.link_handler(href)
+                        return
+                    break
+        super().mouseReleaseEvent(event)
+
 if __name__ == "__main__":
+    # Reindexer workers start as copies of this program in frozen builds
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
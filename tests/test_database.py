@@ -0,0 +1,147 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt5.QtCore import QCoreApplication  # noqa: E402
+
+from main import DatabaseService, create_schema  # noqa: E402
+
+IMAGE_HASH = "ab" * 32
+
+
+def make_database(path, version):
+    """Write a database with the schema and a few notes as a version at PRAGMA user_version version left it."""
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE notes (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL, content TEXT NOT NULL, modified TEXT NOT NULL)")
+    conn.execute("CREATE TABLE note_links (source_id INTEGER NOT NULL, target_title TEXT NOT NULL, PRIMARY KEY (source_id, target_title))")
+    if version >= 2:
+        conn.execute("ALTER TABLE notes ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+    if version >= 3:
+        conn.execute("ALTER TABLE notes ADD COLUMN format TEXT NOT NULL DEFAULT 'html'")
+    if version >= 4:
+        conn.execute("CREATE TABLE change_log (seq INTEGER PRIMARY KEY AUTOINCREMENT, note_id INTEGER NOT NULL UNIQUE)")
+        log = "INSERT OR REPLACE INTO change_log"
+    else:
+        conn.execute("CREATE TABLE change_log (seq INTEGER PRIMARY KEY AUTOINCREMENT, note_id INTEGER NOT NULL)")
+        log = "INSERT INTO change_log"
+    conn.execute(f"CREATE TRIGGER notes_log_insert AFTER INSERT ON notes BEGIN {log} (note_id) VALUES (NEW.id); END")
+    conn.execute(f"CREATE TRIGGER notes_log_update AFTER UPDATE ON notes BEGIN {log} (note_id) VALUES (NEW.id); END")
+    conn.executemany("INSERT INTO notes (title, content, modified) VALUES (?, ?, ?)", [
+        ("First", "<p>see [[Second]]</p>", "2026-01-01 00:00:00"),
+        ("Second", f'<p><img src="blob:{IMAGE_HASH}"></p>', "2026-01-02 00:00:00"),
+    ])
+    conn.execute("UPDATE notes SET modified='2026-01-03 00:00:00' WHERE id=1")
+    conn.execute(f"PRAGMA user_version = {version}")
+    conn.commit()
+    conn.close()
+
+
+class FailingConnection(sqlite3.Connection):
+    # Stands in for a crash at the one statement given
+    fail_at = None
+
+    def execute(self, sql, *args):
+        if sql == self.fail_at:
+            raise sqlite3.OperationalError("interrupted")
+        return super().execute(sql, *args)
+
+
+class MigrationTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        self.path = os.path.join(self.folder.name, "notes.db")
+
+    def open(self, **kwargs):
+        conn = sqlite3.connect(self.path, **kwargs)
+        self.addCleanup(conn.close)
+        return conn
+
+    def columns(self, conn):
+        return {row[1] for row in conn.execute("PRAGMA table_info(notes)")}
+
+    def test_upgrade_from_each_version(self):
+        for version in range(5):
+            with self.subTest(version=version):
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+                make_database(self.path, version)
+                conn = self.open()
+                with conn:
+                    create_schema(conn)
+                self.assertEqual(conn.execute("PRAGMA user_version").fetchone()[0], 5)
+                self.assertLessEqual({"version", "format"}, self.columns(conn))
+                self.assertEqual(conn.execute("SELECT note_id FROM change_log ORDER BY seq").fetchall(), [(2,), (1,)])
+                self.assertEqual(conn.execute("SELECT note_id, hash FROM note_blobs").fetchall(), [(2, IMAGE_HASH)])
+                if version == 0:
+                    self.assertEqual(conn.execute("SELECT source_id, target_title FROM note_links").fetchall(), [(1, "Second")])
+                # The new triggers keep one change_log row per note
+                with conn:
+                    conn.execute("UPDATE notes SET version=1 WHERE id=2")
+                self.assertEqual(conn.execute("SELECT note_id FROM change_log ORDER BY seq").fetchall(), [(1,), (2,)])
+                conn.close()
+
+    def test_interrupted_step_runs_again(self):
+        make_database(self.path, 2)
+        conn = self.open(factory=FailingConnection)
+        conn.fail_at = "PRAGMA user_version = 3"
+        with self.assertRaises(sqlite3.OperationalError):
+            create_schema(conn)
+        conn.close()
+        # The column added by the step went with it, so the next launch can add it again
+        conn = self.open()
+        self.assertEqual(conn.execute("PRAGMA user_version").fetchone()[0], 2)
+        self.assertNotIn("format", self.columns(conn))
+        with conn:
+            create_schema(conn)
+        self.assertEqual(conn.execute("PRAGMA user_version").fetchone()[0], 5)
+        self.assertIn("format", self.columns(conn))
+
+
+class DatabaseServiceTest(unittest.TestCase):
+    def setUp(self):
+        self.app = QCoreApplication.instance() or QCoreApplication([])
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.db = DatabaseService(os.path.join(folder.name, "notes.db"))
+        self.addCleanup(self.db.close)
+        self.db.write(create_schema).result()
+
+    def wait_for(self, condition):
+        deadline = time.monotonic() + 10
+        while not condition():
+            self.assertLess(time.monotonic(), deadline, "timed out")
+            self.app.processEvents()
+            time.sleep(0.001)
+
+    def test_writes_and_callbacks_keep_their_order(self):
+        events = []
+
+        def insert(conn, number):
+            conn.execute("INSERT INTO notes (title, content, modified) VALUES (?, '', '')", (str(number),))
+            if number == 5:
+                raise ValueError(number)
+            return number
+        for number in range(10):
+            self.db.write(insert, number, callback=lambda result: events.append(("done", result)),
+                          on_error=lambda error: events.append(("failed", error.args[0])))
+        self.wait_for(lambda: len(events) == 10)
+        self.assertEqual(events, [("failed" if number == 5 else "done", number) for number in range(10)])
+        # The failed write was rolled back on its own; the ones around it were committed in order
+        rows = self.db.read(lambda conn: conn.execute("SELECT title FROM notes ORDER BY id").fetchall()).result()
+        self.assertEqual(rows, [(str(number),) for number in range(10) if number != 5])
+
+    def test_read_sees_earlier_writes(self):
+        self.db.write(lambda conn: conn.execute("INSERT INTO notes (title, content, modified) VALUES ('a', '', '')"))
+        # A read queued after a write whose future is done sees it
+        self.db.write(lambda conn: None).result()
+        self.assertEqual(self.db.read(lambda conn: conn.execute("SELECT COUNT(*) FROM notes").fetchone()[0]).result(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
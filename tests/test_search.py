@@ -0,0 +1,166 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import (  # noqa: E402
+    WORD_PATTERN, SearchClause, SearchIndex, TagIndex, extract_note_links, parse_search_query, parse_tags, rewrite_note_links,
+    searchable_text
+)
+
+MODIFIED = "2026-01-01 00:00:00"
+
+
+class ParseSearchQueryTest(unittest.TestCase):
+    def test_terms_phrases_and_exclusions(self):
+        self.assertEqual(parse_search_query('Foo "bar baz" -qux'), [
+            SearchClause("text", "foo", False, False),
+            SearchClause("text", "bar baz", False, True),
+            SearchClause("text", "qux", True, False),
+        ])
+
+    def test_fields(self):
+        self.assertEqual(parse_search_query("title:Plan modified:>=2026-01-01 -tag:done,#Old"), [
+            SearchClause("title", "plan", False, False),
+            SearchClause("modified", ("2026-01-01", None), False, True),
+            SearchClause("tag", ("done", "old"), True, True),
+        ])
+
+    def test_invalid_date_searches_text(self):
+        self.assertEqual(parse_search_query("modified:soon"), [SearchClause("text", "modified:soon", False, False)])
+
+    def test_partial_clauses_match_everything(self):
+        for text in ("-", "title:", "tag:", "modified:", "-title:", '"', "  "):
+            self.assertEqual(parse_search_query(text), [], text)
+        self.assertEqual(parse_search_query("foo -"), [SearchClause("text", "foo", False, False)])
+
+
+class SearchIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = SearchIndex()
+        self.index.add(1, "Groceries", "milk eggs\nabcdefghij", "2026-01-05 10:00:00")
+        self.index.add(2, "Plans", "buy milk tomorrow", "2026-02-01 09:00:00")
+        self.index.add(3, "Journal", "nothing about food", MODIFIED)
+
+    def query(self, text, **kwargs):
+        return self.index.query(parse_search_query(text), **kwargs)
+
+    def test_substrings_and_phrases(self):
+        self.assertEqual(self.query("mil"), {1, 2})
+        self.assertEqual(self.query('"milk eggs"'), {1})
+        self.assertEqual(self.query("milk -eggs"), {2})
+        self.assertEqual(self.query("title:plan"), {2})
+
+    def test_without_word_characters(self):
+        self.index.add(4, "Q&A", "questions", MODIFIED)
+        self.index.add(5, "Answers", "a & b", MODIFIED)
+        self.assertEqual(self.query('"&"'), {4})
+        self.assertEqual(self.query('-"&"'), {1, 2, 3, 5})
+
+    def test_modified_range(self):
+        self.assertEqual(self.query("modified:>=2026-01-05"), {1, 2})
+        self.assertEqual(self.query("modified:2026-01-05"), {1})
+
+    def test_within(self):
+        self.assertEqual(self.query("milk", within={2, 3}), {2})
+        self.assertEqual(self.query("-eggs", within={1, 3}), {3})
+
+    def test_fuzzy(self):
+        self.assertEqual(self.query("mulk", fuzzy=True), {1, 2})
+        self.assertEqual(self.query("nohting", fuzzy=True), {3})
+        # A typo in a prefix of a longer word
+        self.assertEqual(self.query("abcxefg", fuzzy=True), {1})
+
+    def test_add_many(self):
+        index = SearchIndex()
+        index.add_many([
+            (note_id, title, searchable_text(title, text), set(WORD_PATTERN.findall(searchable_text(title, text))), modified)
+            for note_id, title, text, modified in [
+                (1, "Groceries", "milk eggs\nabcdefghij", "2026-01-05 10:00:00"),
+                (2, "Plans", "buy milk tomorrow", "2026-02-01 09:00:00"),
+                (3, "Journal", "nothing about food", MODIFIED),
+            ]
+        ])
+        for attribute in ("texts", "titles", "postings", "title_postings", "modified_order", "trigrams"):
+            self.assertEqual(getattr(index, attribute), getattr(self.index, attribute), attribute)
+
+    def test_dump_and_load(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "search-index")
+            with open(path, "wb") as f:
+                f.write(self.index.dump({1: 10, 2: 20, 3: 30}))
+            index, versions = SearchIndex.load(path)
+        self.assertEqual(versions, {1: 10, 2: 20, 3: 30})
+        self.assertEqual(index.texts, {})
+        bodies = {1: ("Groceries", "milk eggs\nabcdefghij"), 2: ("Plans", "buy milk tomorrow"), 3: ("Journal", "nothing about food")}
+        index.text_source = bodies.get
+        self.index = index
+        self.test_substrings_and_phrases()
+        self.test_modified_range()
+        # The body has changed since the index was saved; the words saved with it are what the update takes out
+        bodies[2] = ("Plans", "sell eggs")
+        index.texts.pop(2, None)
+        index.add(2, "Plans", "sell eggs", MODIFIED)
+        self.assertEqual(self.query("tomorrow"), set())
+        self.assertEqual(self.query("eggs"), {1, 2})
+
+    def test_load_unusable(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "search-index")
+            self.assertIsNone(SearchIndex.load(path))
+            with open(path, "wb") as f:
+                f.write(b"garbage")
+            self.assertIsNone(SearchIndex.load(path))
+
+    def test_update_and_remove(self):
+        self.index.add(2, "Plans", "sell eggs", MODIFIED)
+        self.assertEqual(self.query("milk"), {1})
+        self.index.remove(1)
+        self.assertEqual(self.query("eggs"), {2})
+        self.assertEqual(self.query("groceries"), set())
+
+
+class TagIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.tags = TagIndex()
+        self.tags.set_tags(10, ["work", "home"])
+        self.tags.set_tags(20, ["work"])
+        self.tags.set_tags(30, ["home"])
+
+    def query(self, text):
+        return self.tags.query(parse_search_query(text))
+
+    def test_and_or_not(self):
+        self.assertEqual(self.query("tag:work tag:home"), ({10}, set()))
+        self.assertEqual(self.query("tag:work,home -tag:home"), ({20}, set()))
+        self.assertEqual(self.query("-tag:work"), (None, {10, 20}))
+        self.assertEqual(self.query("tag:missing"), (set(), set()))
+
+    def test_ordinals_are_reused(self):
+        self.tags.remove(20)
+        self.tags.set_tags(40, ["work"])
+        self.assertEqual(len(self.tags.note_ids), 3)
+        self.assertEqual(self.query("tag:work"), ({10, 40}, set()))
+        self.assertEqual(self.tags.all_tags(), ["home", "work"])
+
+    def test_parse_tags(self):
+        self.assertEqual(parse_tags("#Work work  home #"), ["work", "home"])
+
+
+class NoteLinksTest(unittest.TestCase):
+    def test_extract(self):
+        content = '<p>see [[A &amp; B]] and <a href="note:Other">Other</a></p>'
+        self.assertEqual(extract_note_links(content), {"A & B", "Other"})
+
+    def test_rewrite(self):
+        content = '<p>[[Old]] [[Older]] <a href="note:Old">Old</a> <a href="note:Olds">Olds</a></p>'
+        self.assertEqual(
+            rewrite_note_links(content, "Old", "New"),
+            '<p>[[New]] [[Older]] <a href="note:New">New</a> <a href="note:Olds">Olds</a></p>'
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
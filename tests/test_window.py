@@ -0,0 +1,170 @@
+import http.client
+import json
+import os
+import socket
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtCore import QSettings  # noqa: E402
+from PyQt5.QtWidgets import QApplication  # noqa: E402
+
+import main  # noqa: E402
+
+app = QApplication.instance() or QApplication([])
+
+
+def wait_for(condition, timeout=10):
+    # Run the event loop until condition() holds, so callbacks queued for the GUI thread are delivered
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        app.processEvents()
+        time.sleep(0.001)
+
+
+class WindowTestCase(unittest.TestCase):
+    """Runs a MainWindow with its notes.db, settings and API token in a temporary folder."""
+
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.data_dir = folder.name
+        # Settings are ini files on Linux, whose folder can be moved; elsewhere they would be the user's own
+        if not sys.platform.startswith("linux"):
+            self.skipTest("settings cannot be redirected on this platform")
+        QSettings.setPath(QSettings.NativeFormat, QSettings.UserScope, self.data_dir)
+        settings = QSettings("Notational Celerity", "Notational Celerity")
+        settings.setValue("backup/enabled", False)
+        settings.setValue("api/port", 0)
+        patcher = mock.patch.object(main.MainWindow, "get_data_dir", return_value=self.data_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.window = main.MainWindow()
+        self.addCleanup(self.window.close)
+        wait_for(self.window.isEnabled)
+
+    def settle(self):
+        # Wait for every write queued so far and for its callback
+        marker = self.window.db.write(lambda conn: None)
+        wait_for(marker.done)
+        app.processEvents()
+
+    def create_note(self, title, text):
+        note = self.window.import_synced_note(None, title, text)
+        self.settle()
+        return note
+
+    def query(self, sql, *args):
+        conn = sqlite3.connect(self.window.get_db_path())
+        try:
+            return conn.execute(sql, args).fetchall()
+        finally:
+            conn.close()
+
+
+class RenameTest(WindowTestCase):
+    def test_rename_rewrites_links(self):
+        target = self.create_note("Target", "the goal")
+        source = self.create_note("Source", "see [[Target]]")
+        self.assertEqual(self.window.rename_note_in_db(target, "Goal"), {source["id"]})
+        self.settle()
+        self.assertEqual(self.query("SELECT title FROM notes WHERE id=?", target["id"]), [("Goal",)])
+        self.assertIn("[[Goal]]", self.query("SELECT content FROM notes WHERE id=?", source["id"])[0][0])
+        self.assertEqual(self.query("SELECT target_title FROM note_links WHERE source_id=?", source["id"]), [("Goal",)])
+
+    def test_stale_version_rolls_back(self):
+        target = self.create_note("Target", "the goal")
+        source = self.create_note("Source", "see [[Target]]")
+        content = self.query("SELECT content FROM notes WHERE id=?", source["id"])[0][0]
+        # Another instance saves the linking note first
+        conn = sqlite3.connect(self.window.get_db_path())
+        with conn:
+            conn.execute("UPDATE notes SET version=version + 1 WHERE id=?", (source["id"],))
+        conn.close()
+        with mock.patch.object(self.window, "apply_external_changes") as reload, \
+                mock.patch.object(self.window, "show_db_error") as show_error:
+            self.window.rename_note_in_db(target, "Goal")
+            self.settle()
+        # The write failed with WriteConflict, which reloads the notes it touched instead of reporting an error
+        reload.assert_called_once_with({target["id"], source["id"]})
+        show_error.assert_not_called()
+        self.assertEqual(self.query("SELECT title FROM notes WHERE id=?", target["id"]), [("Target",)])
+        self.assertEqual(self.query("SELECT content FROM notes WHERE id=?", source["id"]), [(content,)])
+        self.assertEqual(self.query("SELECT target_title FROM note_links WHERE source_id=?", source["id"]), [("Target",)])
+
+
+class ApiTest(WindowTestCase):
+    def setUp(self):
+        super().setUp()
+        self.window.api_action.setChecked(True)
+        self.port = self.window.api.server.server_address[1]
+        with open(os.path.join(self.data_dir, "api-token")) as f:
+            self.token = f.read().strip()
+
+    def request(self, body, token=None, headers=None):
+        """POST body to the API on a thread of its own while the event loop runs; returns (status, reply)."""
+        result = {}
+
+        def send():
+            conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=10)
+            try:
+                conn.request("POST", "/api", body, {"Authorization": f"Bearer {token or self.token}", **(headers or {})})
+                response = conn.getresponse()
+                result["reply"] = response.status, json.loads(response.read())
+            finally:
+                conn.close()
+        thread = threading.Thread(target=send)
+        thread.start()
+        wait_for(lambda: not thread.is_alive())
+        return result["reply"]
+
+    def raw_request(self, headers):
+        # http.client always sends a valid Content-Length, so malformed ones are written by hand
+        with socket.create_connection(("127.0.0.1", self.port), timeout=10) as sock:
+            sock.sendall(f"POST /api HTTP/1.1\r\nHost: localhost\r\nAuthorization: Bearer {self.token}\r\n{headers}\r\n".encode())
+            data = b""
+            while chunk := sock.recv(65536):
+                data += chunk
+        status_line, _, rest = data.partition(b"\r\n")
+        return int(status_line.split()[1]), json.loads(rest.partition(b"\r\n\r\n")[2])
+
+    def test_requests(self):
+        status, reply = self.request(json.dumps([{"op": "create", "title": "Plan", "text": "milk"}, {"op": "nope"}]))
+        self.assertEqual(status, 200)
+        self.assertTrue(reply[0]["ok"])
+        self.assertEqual(reply[1], {"ok": False, "error": "unknown op: 'nope'"})
+        status, reply = self.request(json.dumps({"op": "search", "query": "milk"}))
+        self.assertEqual([note["title"] for note in reply["result"]], ["Plan"])
+
+    def test_bad_token(self):
+        self.assertEqual(self.request("{}", token="wrong"), (401, {"error": "missing or wrong token"}))
+
+    def test_malformed_body(self):
+        status, reply = self.request("{not json")
+        self.assertEqual(status, 400)
+        self.assertTrue(reply["error"].startswith("invalid JSON"))
+
+    def test_bad_content_length(self):
+        self.assertEqual(self.raw_request("Content-Length: abc\r\n")[0], 400)
+        self.assertEqual(self.raw_request("Content-Length: -1\r\n")[0], 400)
+        self.assertEqual(self.raw_request("")[0], 411)
+        self.assertEqual(self.raw_request(f"Content-Length: {main.ApiRequestHandler.MAX_BODY + 1}\r\n")[0], 413)
+
+    def test_internal_error_is_answered(self):
+        with mock.patch.object(main.NoteApi, "op_search", side_effect=RuntimeError("boom")):
+            status, reply = self.request(json.dumps({"op": "search", "query": ""}))
+        self.assertEqual(status, 200)
+        self.assertEqual(reply, {"ok": False, "error": "internal error: RuntimeError('boom')"})
+
+
+if __name__ == "__main__":
+    unittest.main()